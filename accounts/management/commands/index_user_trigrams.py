@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from accounts.models import UserTrigram
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = 'Rebuild the trigram index used by fuzzy user search'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of users indexed per batch'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        total = User.objects.count()
+        done = 0
+        last_id = 0
+
+        while True:
+            users = list(
+                User.objects.filter(id__gt=last_id).order_by('id').only(
+                    'username', 'first_name', 'last_name'
+                )[:chunk_size]
+            )
+            if not users:
+                break
+
+            UserTrigram.index(users)
+
+            done += len(users)
+            last_id = users[-1].pk
+            self.stdout.write(f"Indexed {done}/{total} users")
+
+        self.stdout.write(self.style.SUCCESS('User trigrams rebuilt.'))
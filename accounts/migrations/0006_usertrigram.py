@@ -0,0 +1,58 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:16
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Frozen copy of accounts.trigrams as it was when this migration was written,
+# so later changes to that module can't change what it indexes
+WORD_RE = re.compile(r'[^\W_]+')
+
+
+def user_trigrams(user):
+    text = f'{user.username} {user.first_name} {user.last_name}'
+    decomposed = unicodedata.normalize('NFKD', text)
+    normalized = ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+    grams = set()
+    for word in WORD_RE.findall(normalized):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def index_existing(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    UserTrigram = apps.get_model('accounts', 'UserTrigram')
+    batch = []
+    for user in CustomUser.objects.only('username', 'first_name', 'last_name').iterator():
+        batch.extend(UserTrigram(user_id=user.pk, trigram=gram) for gram in user_trigrams(user))
+        if len(batch) >= 5000:
+            UserTrigram.objects.bulk_create(batch)
+            batch = []
+    UserTrigram.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_alter_customuser_mobile_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('trigram', 'user')},
+            },
+        ),
+        migrations.RunPython(index_existing, migrations.RunPython.noop),
+    ]
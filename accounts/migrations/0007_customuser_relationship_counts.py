@@ -0,0 +1,128 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:40
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+# SQLite rebuilds accounts_customuser to add the counters, which would drop
+# the post search trigger on it and break the ones reading it, so those are
+# set aside for the rebuild (see posts migration 0008)
+SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts (rowid, content, author_name)
+        SELECT new.id, new.content, u.username || ' ' || u.first_name || ' ' || u.last_name
+        FROM accounts_customuser u WHERE u.id = new.author_id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_update AFTER UPDATE OF content, author_id ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+        INSERT INTO posts_post_fts (rowid, content, author_name)
+        SELECT new.id, new.content, u.username || ' ' || u.first_name || ' ' || u.last_name
+        FROM accounts_customuser u WHERE u.id = new.author_id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_author AFTER UPDATE OF username, first_name, last_name
+    ON accounts_customuser BEGIN
+        UPDATE posts_post_fts
+        SET author_name = new.username || ' ' || new.first_name || ' ' || new.last_name
+        WHERE rowid IN (SELECT id FROM posts_post WHERE author_id = new.id);
+    END
+    """,
+]
+
+DROP_SEARCH_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS posts_post_fts_author',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+def count_existing(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    Friendship = apps.get_model('friends', 'Friendship')
+    FriendEdge = apps.get_model('friends', 'FriendEdge')
+    Post = apps.get_model('posts', 'Post')
+
+    def total(rows):
+        return Coalesce(Subquery(rows.annotate(total=Count('*')).values('total')), 0)
+
+    accepted = Friendship.objects.filter(status='accepted').order_by()
+    CustomUser.objects.update(
+        follower_count=total(accepted.filter(user2_id=OuterRef('pk')).values('user2_id')),
+        following_count=total(accepted.filter(user1_id=OuterRef('pk')).values('user1_id')),
+        friend_count=total(
+            FriendEdge.objects.filter(user_id=OuterRef('pk')).order_by().values('user_id')
+        ),
+        post_count=total(
+            Post.objects.filter(author_id=OuterRef('pk')).order_by().values('author_id')
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_usertrigram'),
+        ('friends', '0005_suggesteduser'),
+        ('posts', '0008_post_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(DROP_SEARCH_TRIGGERS), run_on_sqlite(SEARCH_TRIGGERS)),
+        # The self M2M was never written to; follows now live in Friendship
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveField(
+                    model_name='customuser',
+                    name='following',
+                ),
+                migrations.AddField(
+                    model_name='customuser',
+                    name='following',
+                    field=models.ManyToManyField(blank=True, related_name='followers', through='friends.Friendship', through_fields=('user1', 'user2'), to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+            database_operations=[
+                migrations.RemoveField(
+                    model_name='customuser',
+                    name='following',
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='friend_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(run_on_sqlite(SEARCH_TRIGGERS), run_on_sqlite(DROP_SEARCH_TRIGGERS)),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,19 @@
+from collections import defaultdict
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.core.validators import RegexValidator
 
+from .trigrams import similarity, trigrams, user_trigrams
+
+
+# Fields whose trigrams are indexed for user search
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+# Relationship and post counts, only ever changed through F() updates
+COUNTER_FIELDS = ('follower_count', 'following_count', 'friend_count', 'post_count')
+
 
 class CustomUser(AbstractUser):
     phone_regex = RegexValidator(
@@ -22,12 +34,146 @@ class CustomUser(AbstractUser):
     date_of_birth = models.DateField(null=True, blank=True)
     location = models.CharField(max_length=100, blank=True)
     website = models.URLField(max_length=200, blank=True)
+    # A Friendship row is also a follow from user1 to user2; it is what the
+    # home timeline follows
     following = models.ManyToManyField(
         'self',
+        through='friends.Friendship',
+        through_fields=('user1', 'user2'),
         symmetrical=False,
         related_name='followers',
         blank=True
     )
+    # Denormalized so profiles never count the relations
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    friend_count = models.PositiveIntegerField(default=0)
+    post_count = models.PositiveIntegerField(default=0)
     
     def __str__(self):
-        return self.username 
\ No newline at end of file
+        return self.username
+
+    def save(self, *args, **kwargs):
+        # Never write back the possibly stale counters loaded with this instance
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & set(NAME_FIELDS):
+            UserTrigram.index([self])
+
+    @classmethod
+    def adjust_friendship_counts(cls, follower_id, followee_id, delta):
+        """Count a friendship from ``follower_id`` to ``followee_id`` made (+1) or removed (-1)."""
+        cls.objects.filter(pk=follower_id).update(
+            following_count=F('following_count') + delta,
+            friend_count=F('friend_count') + delta
+        )
+        cls.objects.filter(pk=followee_id).update(
+            follower_count=F('follower_count') + delta,
+            friend_count=F('friend_count') + delta
+        )
+
+    @classmethod
+    def recount(cls, queryset=None):
+        """Recompute the counters of ``queryset`` (all users by default).
+
+        Returns the number of users whose counters had drifted.
+        """
+        # Imported here: those apps' models import this one
+        from friends.models import FriendEdge, Friendship
+        from posts.models import Post
+
+        if queryset is None:
+            queryset = cls.objects.all()
+        accepted = Friendship.objects.filter(status='accepted').order_by()
+        actual = {
+            'follower_count': accepted.filter(user2_id=OuterRef('pk')).values('user2_id'),
+            'following_count': accepted.filter(user1_id=OuterRef('pk')).values('user1_id'),
+            'friend_count': FriendEdge.objects.filter(
+                user_id=OuterRef('pk')
+            ).order_by().values('user_id'),
+            'post_count': Post.objects.filter(
+                author_id=OuterRef('pk')
+            ).order_by().values('author_id'),
+        }
+        actual = {
+            field: Coalesce(Subquery(rows.annotate(total=Count('*')).values('total')), 0)
+            for field, rows in actual.items()
+        }
+
+        drifted = queryset.annotate(
+            **{f'actual_{field}': value for field, value in actual.items()}
+        ).exclude(
+            **{field: F(f'actual_{field}') for field in COUNTER_FIELDS}
+        ).values_list('pk', flat=True)
+        return cls.objects.filter(pk__in=list(drifted)).update(**actual)
+
+class UserTrigram(models.Model):
+    """One trigram of a user's normalized names, for fuzzy user search."""
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='trigrams'
+    )
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        # Leading trigram column makes this the posting-list index
+        unique_together = ('trigram', 'user')
+
+    def __str__(self):
+        return f"{self.trigram!r} of user {self.user_id}"
+
+    @classmethod
+    def index(cls, users):
+        """Bring the trigram rows of ``users`` in line with their names."""
+        wanted = {
+            (user.pk, gram) for user in users if user.pk for gram in user_trigrams(user)
+        }
+        user_ids = {user.pk for user in users if user.pk}
+        with transaction.atomic():
+            current = set(
+                cls.objects.filter(user_id__in=user_ids).values_list('user_id', 'trigram')
+            )
+            cls.objects.bulk_create(
+                [cls(user_id=user_id, trigram=gram) for user_id, gram in wanted - current],
+                ignore_conflicts=True
+            )
+            stale = defaultdict(list)
+            for user_id, gram in current - wanted:
+                stale[user_id].append(gram)
+            for user_id, grams in stale.items():
+                cls.objects.filter(user_id=user_id, trigram__in=grams).delete()
+
+    @classmethod
+    def search(cls, query, limit=10, exclude_id=None, candidates=200):
+        """Users whose names best match ``query``, tolerating typos.
+
+        Users sharing the most trigrams with ``query`` are read from the
+        trigram index, then the best ``candidates`` of them are ranked by
+        trigram similarity to their names. The users table is only read for
+        those candidates.
+        """
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        hits = cls.objects.filter(trigram__in=query_grams)
+        if exclude_id is not None:
+            hits = hits.exclude(user_id=exclude_id)
+        # Require half of the query's trigrams so one shared letter pair
+        # doesn't make everyone a candidate
+        minimum = max(1, len(query_grams) // 2)
+        top = hits.values('user_id').annotate(
+            shared=Count('*')
+        ).filter(shared__gte=minimum).order_by('-shared', 'user_id')[:candidates]
+
+        users = CustomUser.objects.in_bulk([row['user_id'] for row in top])
+        ranked = sorted(
+            users.values(),
+            key=lambda user: (-similarity(query_grams, user_trigrams(user)), user.username)
+        )
+        return ranked[:limit] 
\ No newline at end of file
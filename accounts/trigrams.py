@@ -0,0 +1,39 @@
+"""Name normalization and trigram extraction for fuzzy user search.
+
+Names are lowercased, stripped of accents and split into words; each word is
+padded with two leading spaces and one trailing space, so short names and
+word starts still produce trigrams (``'ann'`` gives ``'  a'``, ``' an'``,
+``'ann'``, ``'nn '``).
+"""
+import re
+import unicodedata
+
+WORD_RE = re.compile(r'[^\W_]+')
+
+
+def normalize(text):
+    """Lowercase, accent-free form of ``text``."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def trigrams(text):
+    """The set of trigrams of every word in ``text``."""
+    grams = set()
+    for word in WORD_RE.findall(normalize(text)):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def user_trigrams(user):
+    """Trigrams of a user's username, first name and last name."""
+    return trigrams(f'{user.username} {user.first_name} {user.last_name}')
+
+
+def similarity(query_grams, grams):
+    """Jaccard similarity of two trigram sets."""
+    if not query_grams or not grams:
+        return 0.0
+    shared = len(query_grams & grams)
+    return shared / (len(query_grams) + len(grams) - shared)
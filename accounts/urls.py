@@ -6,9 +6,12 @@ app_name = 'accounts'
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('more/', views.home, {'fragment': True}, name='home_more'),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path('profile/<str:username>/more/', views.profile, {'fragment': True}, name='profile_more'),
     path('settings/', views.account_settings, name='account_settings'),
     path('search/', views.search_users, name='search_users'),
+    path('search/autocomplete/', views.autocomplete_users, name='autocomplete_users'),
     path('login/', auth_views.LoginView.as_view(template_name='account/login.html'), name='login'),
     path('logout/', views.logout_view, name='logout'),
     # Using allauth's logout view instead
@@ -2,106 +2,116 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.db.models import Prefetch, Q
+from django.urls import reverse
 from .forms import UserProfileForm
-from posts.models import Post
-from friends.models import Friendship
+from .models import UserTrigram
+from .trigrams import normalize
+from posts.models import Post, Comment
+from posts import like_buffer, pagination
+from posts.timeline import FEED_PAGE_SIZE
+from friends import suggestions
+from friends.graph import label_mutual_friends
+from friends.models import FriendEdge, FriendRequest
 from django.contrib.auth import logout
 from django.core.files import File
+import hashlib
 import os
 from django.conf import settings
 
 
 User = get_user_model()
 
+# Users listed on the search page and in autocomplete suggestions
+SEARCH_RESULTS = 50
+AUTOCOMPLETE_RESULTS = 8
+# Seconds a query's suggestions stay cached, so repeated keystrokes are free
+AUTOCOMPLETE_CACHE_TIMEOUT = 60
+AUTOCOMPLETE_KEY = 'accounts:autocomplete:{}'
+
 
 @login_required
-def home(request):
+def home(request, fragment=False):
     """Home page view that shows recent posts from friends."""
-    # Get all posts
-    posts = Post.objects.select_related('author').prefetch_related('likes', 'comments').all()
-    
-    # Create or get sample suggested users
-    sample_users_data = [
-        {
-            'username': 'tech_enthusiast',
-            'first_name': 'Alex',
-            'last_name': 'Johnson',
-            'email': 'alex@example.com',
-            'bio': 'Tech lover | Developer | Coffee addict'
-        },
-        {
-            'username': 'travel_lover',
-            'first_name': 'Sarah',
-            'last_name': 'Williams',
-            'email': 'sarah@example.com',
-            'bio': 'Wanderlust | Photographer | Adventure seeker'
-        },
-        {
-            'username': 'foodie_chef',
-            'first_name': 'Michael',
-            'last_name': 'Chen',
-            'email': 'michael@example.com',
-            'bio': 'Professional Chef | Food Blogger | Recipe Creator'
-        },
-        {
-            'username': 'fitness_guru',
-            'first_name': 'Emma',
-            'last_name': 'Davis',
-            'email': 'emma@example.com',
-            'bio': 'Fitness Trainer | Nutritionist | Wellness Coach'
-        },
-        {
-            'username': 'art_creator',
-            'first_name': 'David',
-            'last_name': 'Park',
-            'email': 'david@example.com',
-            'bio': 'Digital Artist | Illustrator | Creative Director'
-        }
-    ]
+    # Get one page of recent posts
+    posts, next_cursor = pagination.paginate(
+        Post.objects.select_related('author').with_viewer_state(request.user),
+        request.GET.get('cursor'),
+        FEED_PAGE_SIZE
+    )
+    like_buffer.overlay(posts, request.user)
+    page = {
+        'posts': posts,
+        'next_cursor': next_cursor,
+        'more_url': reverse('accounts:home_more'),
+    }
+    if fragment:
+        page['card_template'] = 'accounts/includes/post_item.html'
+        return render(request, 'posts/post_cards.html', page)
     
-    # Create or get users
-    suggested_users = []
-    for user_data in sample_users_data:
-        user, created = User.objects.get_or_create(
-            username=user_data['username'],
-            defaults={
-                'first_name': user_data['first_name'],
-                'last_name': user_data['last_name'],
-                'email': user_data['email'],
-                'bio': user_data['bio'],
-                'is_active': True
-            }
-        )
-        if created:
-            # Set a default password for new users
-            user.set_password('samplepassword123')
-            user.save()
-        suggested_users.append(user)
+    if request.user.is_authenticated:
+        # Precomputed by the refresh_suggestions command
+        suggested_users = suggestions.suggested_users(request.user)
+    else:
+        suggested_users = []
     
     context = {
-        'posts': posts,
+        **page,
         'suggested_users': suggested_users
     }
     return render(request, 'accounts/home.html', context)
 
 
-def profile(request, username):
+def profile(request, username, fragment=False):
     user = get_object_or_404(User, username=username)
-    posts = Post.objects.filter(author=user).select_related('author').prefetch_related('likes', 'comments')
+    posts, next_cursor = pagination.paginate(
+        Post.objects.filter(author=user).select_related('author').with_viewer_state(
+            request.user
+        ).prefetch_related(
+            Prefetch('comments', queryset=Comment.objects.select_related('author'))
+        ),
+        request.GET.get('cursor'),
+        FEED_PAGE_SIZE
+    )
+    like_buffer.overlay(posts, request.user)
+    page = {
+        'posts': posts,
+        'next_cursor': next_cursor,
+        'more_url': reverse('accounts:profile_more', kwargs={'username': username}),
+    }
+    if fragment:
+        page['card_template'] = 'accounts/includes/profile_post.html'
+        return render(request, 'posts/post_cards.html', page)
     
-    # Check if the current user is friends with the profile user
-    is_friend = False
-    if request.user.is_authenticated:
-        is_friend = Friendship.objects.filter(
-            Q(user1=request.user, user2=user) |
-            Q(user1=user, user2=request.user)
-        ).exists()
+    # Relationship between the viewer and the profile user; the counts
+    # shown are the denormalized ones on the user row
+    relationship = None
+    friendship_id = None
+    friend_request = None
+    if request.user.is_authenticated and request.user != user:
+        friendship_id = FriendEdge.friendship_between(request.user.pk, user.pk)
+        if friendship_id is not None:
+            relationship = 'friends'
+        else:
+            friend_request = FriendRequest.objects.filter(
+                Q(sender=request.user, receiver=user) | Q(sender=user, receiver=request.user),
+                status='pending'
+            ).first()
+            if friend_request is not None and friend_request.sender_id == request.user.pk:
+                relationship = 'request_sent'
+            elif friend_request is not None:
+                relationship = 'request_received'
+    label_mutual_friends(request.user, [user])
     
     context = {
+        **page,
         'profile_user': user,
-        'posts': posts,
-        'is_friend': is_friend,
+        'relationship': relationship,
+        'is_friend': friendship_id is not None,
+        'friendship_id': friendship_id,
+        'friend_request': friend_request,
     }
     return render(request, 'accounts/profile.html', context)
 
@@ -124,18 +134,41 @@ def account_settings(request):
 def search_users(request):
     query = request.GET.get('q', '')
     if query:
-        users = User.objects.filter(
-            Q(username__icontains=query) |
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query)
-        ).exclude(id=request.user.id)
+        users = label_mutual_friends(
+            request.user,
+            UserTrigram.search(query, limit=SEARCH_RESULTS, exclude_id=request.user.id)
+        )
     else:
         users = []
     
     return render(request, 'accounts/search.html', {
         'users': users,
         'query': query
-    }) 
+    })
+
+
+def autocomplete_users(request):
+    """Best fuzzy matches for ``?q=`` as JSON, for search-as-you-type."""
+    # JSON callers get a 401 instead of the login redirect
+    if not request.user.is_authenticated:
+        return JsonResponse({'results': []}, status=401)
+    query = normalize(request.GET.get('q', '')).strip()
+    if len(query) < 2:
+        return JsonResponse({'results': []})
+    key = AUTOCOMPLETE_KEY.format(hashlib.md5(query.encode()).hexdigest())
+    results = cache.get(key)
+    if results is None:
+        results = [
+            {
+                'username': user.username,
+                'name': user.get_full_name(),
+                'url': reverse('accounts:profile', args=[user.username]),
+            }
+            for user in UserTrigram.search(query, limit=AUTOCOMPLETE_RESULTS)
+        ]
+        cache.set(key, results, AUTOCOMPLETE_CACHE_TIMEOUT)
+    return JsonResponse({'results': results})
+    
     
 def logout_view(request):
     logout(request)
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GraphStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('computed_at', models.DateTimeField(auto_now_add=True)),
+                ('users', models.IntegerField(default=0)),
+                ('friendships', models.IntegerField(default=0)),
+                ('isolated_users', models.IntegerField(default=0)),
+                ('mean_degree', models.FloatField(default=0)),
+                ('median_degree', models.FloatField(default=0)),
+                ('max_degree', models.IntegerField(default=0)),
+                ('degree_histogram', models.JSONField(default=list)),
+                ('components', models.IntegerField(default=0)),
+                ('largest_component', models.IntegerField(default=0)),
+                ('clustering_coefficient', models.FloatField(default=0)),
+                ('clustering_sample', models.IntegerField(default=0)),
+                ('top_hubs', models.JSONField(default=list)),
+                ('duration', models.FloatField(default=0, help_text='Seconds taken to compute')),
+            ],
+            options={
+                'verbose_name': 'Graph Stats',
+                'verbose_name_plural': 'Graph Stats',
+                'ordering': ['-computed_at'],
+                'get_latest_by': 'computed_at',
+            },
+        ),
+    ]
@@ -41,8 +41,8 @@ class DailyMetrics(models.Model):
             Q(liked_posts__created_at__date=today) |
             Q(friendships1__created_at__date=today) |
             Q(friendships2__created_at__date=today) |
-            Q(friend_messages_sent__created_at__date=today) |
-            Q(friend_messages_received__created_at__date=today)
+            Q(sent_messages__created_at__date=today) |
+            Q(received_messages__created_at__date=today)
         ).distinct()
         metrics.active_users = active_users_query.count()
         
@@ -129,4 +129,35 @@ class UserActivity(models.Model):
             }
         )
         
-        return activity 
\ No newline at end of file
+        return activity 
+
+class GraphStats(models.Model):
+    """Friendship graph summary written by the ``graph_stats`` command."""
+    computed_at = models.DateTimeField(auto_now_add=True)
+    users = models.IntegerField(default=0)
+    friendships = models.IntegerField(default=0)
+    isolated_users = models.IntegerField(default=0)
+    mean_degree = models.FloatField(default=0)
+    median_degree = models.FloatField(default=0)
+    max_degree = models.IntegerField(default=0)
+    # [{"min": 2, "max": 3, "users": 120}, ...] in power-of-two buckets
+    degree_histogram = models.JSONField(default=list)
+    # Components of users with at least one friend
+    components = models.IntegerField(default=0)
+    largest_component = models.IntegerField(default=0)
+    # Mean local clustering coefficient over a random sample of users
+    clustering_coefficient = models.FloatField(default=0)
+    clustering_sample = models.IntegerField(default=0)
+    # [{"id": 1, "username": "...", "degree": 42}, ...], best connected first
+    top_hubs = models.JSONField(default=list)
+    duration = models.FloatField(default=0, help_text='Seconds taken to compute')
+
+    class Meta:
+        ordering = ['-computed_at']
+        get_latest_by = 'computed_at'
+        verbose_name = 'Graph Stats'
+        verbose_name_plural = 'Graph Stats'
+        app_label = 'analytics'
+
+    def __str__(self):
+        return f"Graph stats at {self.computed_at}"
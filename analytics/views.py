@@ -5,11 +5,11 @@ from django.utils import timezone
 from datetime import timedelta
 from django.contrib.auth import get_user_model
 from django.contrib import messages
-from .models import DailyMetrics, UserActivity
+from .models import DailyMetrics, GraphStats, UserActivity
 from posts.models import Post, Comment
+from posts import hashtags, search, timeline, trending
 from friends.models import Friendship
 from private_messages.models import Message
-import re
 
 User = get_user_model()
 
@@ -50,6 +50,9 @@ def analytics_dashboard(request):
         activity_count=Count('posts') + Count('comments') + Count('liked_posts')
     ).order_by('-activity_count')[:5]
     
+    # Latest friendship graph summary from the graph_stats command
+    graph_stats = GraphStats.objects.first()
+    
     # Prepare data for charts
     dates = [metric.date.strftime('%Y-%m-%d') for metric in daily_metrics]
     active_users = [metric.active_users for metric in daily_metrics]
@@ -75,6 +78,7 @@ def analytics_dashboard(request):
         'avg_friendships': round(avg_friendships, 1),
         'avg_messages': round(avg_messages, 1),
         'top_users': top_users,
+        'graph_stats': graph_stats,
         'date_range': f"{start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}",
         'chart_data': {
             'dates': dates,
@@ -135,7 +139,7 @@ def post_management(request):
     
     # Apply filters if provided
     if search_query:
-        posts = posts.filter(content__icontains=search_query)
+        posts = search.filter_posts(posts, search_query)
     if author_filter:
         posts = posts.filter(author__username__icontains=author_filter)
     
@@ -157,6 +161,8 @@ def edit_post(request, post_id):
         if content:
             post.content = content
             post.save()
+            hashtags.index_post(post)
+            timeline.fan_out_post(post)
             messages.success(request, 'Post updated successfully.')
             return redirect('analytics:post_management')
     
@@ -183,22 +189,8 @@ def delete_post(request, post_id):
     return render(request, 'analytics/delete_post.html', context)
 
 def get_trending_topics():
-    # Get posts from the last 7 days
-    start_date = timezone.now() - timedelta(days=7)
-    recent_posts = Post.objects.filter(created_at__gte=start_date)
-    
-    # Extract hashtags and count their occurrences
-    hashtag_counts = {}
-    for post in recent_posts:
-        hashtags = re.findall(r'#(\w+)', post.content.lower())
-        for tag in hashtags:
-            hashtag_counts[tag] = hashtag_counts.get(tag, 0) + 1
-    
-    # Sort hashtags by count and get top 10
-    trending_topics = sorted(
-        hashtag_counts.items(),
-        key=lambda x: x[1],
-        reverse=True
-    )[:10]
-    
-    return trending_topics 
\ No newline at end of file
+    """``(name, post count)`` of the top topics over the last 7 days."""
+    return [
+        (topic.name, topic.post_count)
+        for topic in trending.trending(window_hours=7 * 24)
+    ]
@@ -5,4 +5,5 @@ app_name = 'core'
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('more/', views.home, {'fragment': True}, name='home_more'),
 ] 
\ No newline at end of file
@@ -1,14 +1,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Count, Q
+from django.db import transaction
+from django.db.models import Q
 from .models import Post, Comment, Topic
-from accounts.models import CustomUser
+from accounts.models import UserTrigram
+from friends import suggestions
 from friends.models import Friendship
-from datetime import datetime, timedelta
-import re
+from django.urls import reverse
+from posts import hashtags, like_buffer, pagination, sketch, timeline
+from posts.search import search_posts
 
-def home(request):
+def home(request, fragment=False):
     if not request.user.is_authenticated:
         return redirect('accounts:login')
     
@@ -18,31 +21,32 @@ def home(request):
         status='accepted'
     ).values_list('user2_id', flat=True)
     
-    # Get posts from followed users and the current user
-    posts = Post.objects.filter(
-        Q(author_id__in=following) | Q(author=request.user)
-    ).select_related('author').order_by('-created_at')
-    
-    # Filter out posts with invalid authors
-    posts = [post for post in posts if post.author and post.author.username]
+    # Get one page of posts from followed users and the current user
+    posts, next_cursor = pagination.paginate(
+        Post.objects.filter(
+            Q(author_id__in=following) | Q(author=request.user)
+        ).select_related('author').with_viewer_state(request.user),
+        request.GET.get('cursor'),
+        timeline.FEED_PAGE_SIZE
+    )
+    like_buffer.overlay(posts, request.user)
+    page = {
+        'posts': posts,
+        'next_cursor': next_cursor,
+        'more_url': reverse('core:home_more'),
+    }
+    if fragment:
+        page['card_template'] = 'core/includes/post_card.html'
+        return render(request, 'posts/post_cards.html', page)
     
-    # Get trending topics (topics with most posts in the last 7 days)
-    trending_topics = Topic.objects.filter(
-        post__created_at__gte=datetime.now() - timedelta(days=7)
-    ).annotate(
-        post_count=Count('post')
-    ).order_by('-post_count')[:5]
+    # Get trending topics
+    trending_topics = sketch.live_trending(limit=5)
     
-    # Get suggested users (users not being followed)
-    following_ids = list(following) + [request.user.id]
-    suggested_users = CustomUser.objects.exclude(
-        id__in=following_ids
-    ).exclude(
-        id=request.user.id
-    ).order_by('?')[:5]
+    # Precomputed by the refresh_suggestions command
+    suggested_users = suggestions.suggested_users(request.user)
     
     context = {
-        'posts': posts,
+        **page,
         'trending_topics': trending_topics,
         'suggested_users': suggested_users,
     }
@@ -63,18 +67,14 @@ def create_post(request):
                 image=image,
                 video=video
             )
+            stats = timeline.FeedStats()
+            timeline.fan_out_post(post, stats)
             
             # Extract and create topics from content
-            if content:
-                words = content.split()
-                for word in words:
-                    if word.startswith('#'):
-                        topic_name = word[1:].lower()
-                        topic, created = Topic.objects.get_or_create(name=topic_name)
-                        post.topics.add(topic)
+            hashtags.index_post(post)
             
             messages.success(request, 'Post created successfully!')
-            return redirect('core:home')
+            return stats.emit(redirect('core:home'))
         else:
             messages.error(request, 'Post cannot be empty!')
     
@@ -98,14 +98,7 @@ def edit_post(request, post_id):
             post.save()
             
             # Update topics
-            post.topics.clear()
-            if content:
-                words = content.split()
-                for word in words:
-                    if word.startswith('#'):
-                        topic_name = word[1:].lower()
-                        topic, created = Topic.objects.get_or_create(name=topic_name)
-                        post.topics.add(topic)
+            hashtags.index_post(post)
             
             messages.success(request, 'Post updated successfully!')
             return redirect('core:post_detail', post_id=post.id)
@@ -123,11 +116,8 @@ def delete_post(request, post_id):
 
 @login_required
 def like_post(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    if request.user in post.likes.all():
-        post.likes.remove(request.user)
-    else:
-        post.likes.add(request.user)
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    like_buffer.toggle_like(post, request.user)
     return redirect('core:home')
 
 @login_required
@@ -138,11 +128,13 @@ def post_detail(request, post_id):
     if request.method == 'POST':
         content = request.POST.get('content')
         if content:
-            Comment.objects.create(
-                post=post,
-                author=request.user,
-                content=content
-            )
+            with transaction.atomic():
+                Comment.objects.create(
+                    post=post,
+                    author=request.user,
+                    content=content
+                )
+                Post.adjust_counts(post.pk, comments=1)
             return redirect('core:post_detail', post_id=post.id)
     
     return render(request, 'core/post_detail.html', {
@@ -164,19 +156,10 @@ def search(request):
     query = request.GET.get('q', '')
     if query:
         # Search in posts
-        posts = Post.objects.filter(
-            Q(content__icontains=query) |
-            Q(author__username__icontains=query) |
-            Q(author__first_name__icontains=query) |
-            Q(author__last_name__icontains=query)
-        ).distinct()
+        posts, has_next = search_posts(query)
         
         # Search in users
-        users = CustomUser.objects.filter(
-            Q(username__icontains=query) |
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query)
-        ).exclude(id=request.user.id)
+        users = UserTrigram.search(query, limit=50, exclude_id=request.user.id)
         
         # Search in topics
         topics = Topic.objects.filter(name__icontains=query)
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class FriendsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'friends' 
\ No newline at end of file
+    name = 'friends'
+
+    def ready(self):
+        # Connects the receivers that keep the in-memory friendship graph current
+        from . import graph  # noqa: F401
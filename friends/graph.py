@@ -0,0 +1,258 @@
+"""In-memory friendship graph in compressed sparse row (CSR) form.
+
+The friends of user ``u`` are ``neighbors[offsets[u]:offsets[u + 1]]``, a
+sorted ``int32`` array, so the whole graph costs 4 bytes per user id plus 8
+bytes per friendship (both directions): 10M friendships fit in about 80 MB.
+Rows are indexed by user id directly, so no id mapping is kept.
+
+Each process loads the graph on first use by streaming ``FriendEdge`` rows in
+``(user, friend)`` index order, which yields every row already sorted.
+Friendships made or removed in this process arrive through the signals in
+``friends.signals`` and are kept in a small overlay on top of the arrays;
+the graph is reloaded every ``FRIEND_GRAPH_REBUILD_INTERVAL`` seconds, or
+sooner once the overlay holds ``OVERLAY_LIMIT`` changes, to pick up
+friendships made by other processes.
+"""
+import threading
+import time
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Max
+from django.dispatch import receiver
+
+from .models import FriendEdge
+from .signals import friendship_created, friendship_removed
+
+User = get_user_model()
+
+# Seconds between reloads of each process's graph
+FRIEND_GRAPH_REBUILD_INTERVAL = getattr(settings, 'FRIEND_GRAPH_REBUILD_INTERVAL', 3600)
+# Friendships added or removed in this process before the graph is reloaded
+OVERLAY_LIMIT = 10000
+# Edge rows fetched per database round trip while loading
+LOAD_CHUNK_SIZE = 50000
+
+# Mutual friends named next to a user
+MUTUAL_SAMPLE_SIZE = 3
+
+EMPTY = np.zeros(0, dtype=np.int32)
+
+
+def load_csr(progress=None):
+    """Read every ``FriendEdge`` into ``(offsets, neighbors)`` arrays.
+
+    ``progress(loaded, total)`` is called after each chunk if given.
+    """
+    max_id = User.objects.aggregate(top=Max('id'))['top'] or 0
+    neighbors = np.empty(FriendEdge.objects.count(), dtype=np.int32)
+    degrees = np.zeros(max_id + 1, dtype=np.int32)
+    filled = 0
+
+    rows = FriendEdge.objects.order_by('user_id', 'friend_id').values_list(
+        'user_id', 'friend_id'
+    ).iterator(chunk_size=LOAD_CHUNK_SIZE)
+    while True:
+        chunk = np.array(list(islice(rows, LOAD_CHUNK_SIZE)), dtype=np.int32).reshape(-1, 2)
+        if not len(chunk):
+            break
+        users, friends = chunk[:, 0], chunk[:, 1]
+        # Users who signed up after max_id was read
+        top = max(users.max(), friends.max())
+        if top >= len(degrees):
+            degrees = np.concatenate([degrees, np.zeros(top + 1 - len(degrees), dtype=np.int32)])
+        # Edges added after the count was read
+        if filled + len(chunk) > len(neighbors):
+            neighbors = np.resize(neighbors, filled + len(chunk))
+        neighbors[filled:filled + len(chunk)] = friends
+        degrees += np.bincount(users, minlength=len(degrees)).astype(np.int32)
+        filled += len(chunk)
+        if progress is not None:
+            progress(filled, len(neighbors))
+
+    offsets = np.zeros(len(degrees) + 1, dtype=np.int32)
+    np.cumsum(degrees, out=offsets[1:])
+    return offsets, neighbors[:filled]
+
+
+def intersect(a, b):
+    """Sorted values two sorted, duplicate-free arrays share.
+
+    Binary-searches each value of the shorter array in the longer one.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    if not len(a):
+        return EMPTY
+    positions = np.searchsorted(b, a)
+    positions[positions == len(b)] = 0
+    return a[b[positions] == a]
+
+
+def count_common(a, b):
+    """Number of values two sorted, duplicate-free arrays share."""
+    return len(intersect(a, b))
+
+
+class SocialGraph:
+    """Thread-safe CSR friendship graph with an overlay of recent changes."""
+
+    def __init__(self, loader=load_csr):
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._offsets = np.zeros(1, dtype=np.int32)
+        self._neighbors = EMPTY
+        # user id -> friend ids added or removed since the arrays were loaded
+        self._added = {}
+        self._removed = {}
+        self._changes = 0
+        # Changes made while a reload runs, replayed onto the new arrays
+        self._log = None
+        self._built_at = None
+
+    def _fresh(self):
+        return (
+            self._built_at is not None
+            and time.monotonic() - self._built_at < FRIEND_GRAPH_REBUILD_INTERVAL
+            and self._changes < OVERLAY_LIMIT
+        )
+
+    def _ensure_built(self):
+        if self._fresh():
+            return
+        # Until the first load every caller waits for it; afterwards the
+        # current arrays keep serving while one thread reloads
+        if not self._build_lock.acquire(blocking=self._built_at is None):
+            return
+        try:
+            if self._fresh():
+                return
+            with self._lock:
+                self._log = []
+            try:
+                offsets, neighbors = self.loader()
+            except Exception:
+                with self._lock:
+                    self._log = None
+                raise
+            with self._lock:
+                log, self._log = self._log, None
+                self._offsets, self._neighbors = offsets, neighbors
+                self._added, self._removed, self._changes = {}, {}, 0
+                self._built_at = time.monotonic()
+                for linked, user_a, user_b in log:
+                    self._apply(linked, user_a, user_b)
+        finally:
+            self._build_lock.release()
+
+    def _apply(self, linked, user_a, user_b):
+        # Caller holds the lock
+        if self._log is not None:
+            self._log.append((linked, user_a, user_b))
+        for user, friend in ((user_a, user_b), (user_b, user_a)):
+            self._removed.get(user, set()).discard(friend)
+            self._added.get(user, set()).discard(friend)
+            if linked != self._in_base(user, friend):
+                changes = self._added if linked else self._removed
+                changes.setdefault(user, set()).add(friend)
+        self._changes += 1
+
+    def _in_base(self, user, friend):
+        row = self._row(user)
+        position = np.searchsorted(row, friend)
+        return position < len(row) and row[position] == friend
+
+    def _row(self, user):
+        if user + 1 >= len(self._offsets):
+            return EMPTY
+        return self._neighbors[self._offsets[user]:self._offsets[user + 1]]
+
+    def add(self, user_a, user_b):
+        with self._lock:
+            self._apply(True, user_a, user_b)
+
+    def remove(self, user_a, user_b):
+        with self._lock:
+            self._apply(False, user_a, user_b)
+
+    def neighbors(self, user_id):
+        """Sorted ``int32`` array of a user's friend ids."""
+        self._ensure_built()
+        with self._lock:
+            row = self._row(user_id)
+            removed = self._removed.get(user_id)
+            added = self._added.get(user_id)
+            if removed:
+                row = row[~np.isin(row, list(removed))]
+            if added:
+                row = np.union1d(row, np.fromiter(added, dtype=np.int32, count=len(added)))
+            return row
+
+    def degree(self, user_id):
+        return len(self.neighbors(user_id))
+
+    def are_friends(self, user_a, user_b):
+        row = self.neighbors(user_a)
+        position = np.searchsorted(row, user_b)
+        return bool(position < len(row) and row[position] == user_b)
+
+    def mutual_count(self, user_a, user_b):
+        """Number of friends two users have in common."""
+        return count_common(self.neighbors(user_a), self.neighbors(user_b))
+
+    def mutual_friends(self, viewer_id, user_ids, sample_size=MUTUAL_SAMPLE_SIZE):
+        """``{user id: (mutual count, sample of mutual friend ids)}`` for a viewer."""
+        mine = self.neighbors(viewer_id)
+        result = {}
+        for user_id in user_ids:
+            common = intersect(mine, self.neighbors(user_id))
+            result[user_id] = (len(common), common[:sample_size].tolist())
+        return result
+
+    def degrees(self):
+        """Friend count of every user id loaded, indexed by user id.
+
+        Changes made since the last load are not included.
+        """
+        self._ensure_built()
+        with self._lock:
+            return np.diff(self._offsets)
+
+
+social_graph = SocialGraph()
+
+
+def label_mutual_friends(viewer, users):
+    """Set ``mutual_friend_count`` and ``mutual_friends`` on each of ``users``.
+
+    Counts come from the in-memory graph; the sampled friends of every user
+    are read in one query.
+    """
+    if not viewer.is_authenticated:
+        for user in users:
+            user.mutual_friend_count, user.mutual_friends = 0, []
+        return users
+    found = social_graph.mutual_friends(
+        viewer.pk, [user.pk for user in users if user.pk != viewer.pk]
+    )
+    sampled = User.objects.only('username', 'first_name', 'last_name').in_bulk(
+        {friend_id for count, sample in found.values() for friend_id in sample}
+    )
+    for user in users:
+        count, sample = found.get(user.pk, (0, []))
+        user.mutual_friend_count = count
+        user.mutual_friends = [sampled[friend_id] for friend_id in sample if friend_id in sampled]
+    return users
+
+
+@receiver(friendship_created, dispatch_uid='friends.graph.friendship_created')
+def friendship_linked(sender, user_a, user_b, **kwargs):
+    social_graph.add(user_a, user_b)
+
+
+@receiver(friendship_removed, dispatch_uid='friends.graph.friendship_removed')
+def friendship_unlinked(sender, user_a, user_b, **kwargs):
+    social_graph.remove(user_a, user_b)
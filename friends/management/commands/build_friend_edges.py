@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from friends.models import FriendEdge, Friendship
+
+class Command(BaseCommand):
+    help = 'Create the mirrored FriendEdge rows of every accepted friendship'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Number of friendships linked per batch'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        accepted = Friendship.objects.filter(status='accepted').only(
+            'user1_id', 'user2_id', 'created_at'
+        ).order_by('id')
+        total = accepted.count()
+        done = 0
+        last_id = 0
+
+        while True:
+            friendships = list(accepted.filter(id__gt=last_id)[:chunk_size])
+            if not friendships:
+                break
+
+            FriendEdge.link(friendships)
+
+            done += len(friendships)
+            last_id = friendships[-1].pk
+            self.stdout.write(f"Linked {done}/{total} friendships")
+
+        self.stdout.write(self.style.SUCCESS('Friend edges built.'))
@@ -10,10 +10,10 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         # Print all friendships
         self.stdout.write("All Friendships:")
-        for friendship in Friendship.objects.all():
+        for friendship in Friendship.objects.select_related('user1', 'user2'):
             self.stdout.write(f"{friendship.user1.username} - {friendship.user2.username} ({friendship.status})")
 
         # Print all friend requests
         self.stdout.write("\nAll Friend Requests:")
-        for request in FriendRequest.objects.all():
+        for request in FriendRequest.objects.select_related('sender', 'receiver'):
             self.stdout.write(f"{request.sender.username} -> {request.receiver.username} ({request.status})") 
\ No newline at end of file
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from friends.suggestions import SuggestionBuilder
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = 'Recompute the stored friend suggestions of every active user'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of users refreshed per batch'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        builder = SuggestionBuilder()
+        users = User.objects.filter(is_active=True).order_by('id')
+        total = users.count()
+        done = 0
+        stored = 0
+        last_id = 0
+
+        while True:
+            user_ids = list(users.filter(id__gt=last_id).values_list('id', flat=True)[:chunk_size])
+            if not user_ids:
+                break
+
+            stored += builder.refresh(user_ids)
+
+            done += len(user_ids)
+            last_id = user_ids[-1]
+            self.stdout.write(f"Refreshed {done}/{total} users")
+
+        self.stdout.write(self.style.SUCCESS(f'Stored {stored} suggestions.'))
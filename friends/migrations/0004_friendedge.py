@@ -0,0 +1,57 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def link_accepted(apps, schema_editor):
+    # Mirror existing friendships; build_friend_edges repairs the same way later
+    Friendship = apps.get_model('friends', 'Friendship')
+    FriendEdge = apps.get_model('friends', 'FriendEdge')
+    accepted = Friendship.objects.filter(status='accepted').only(
+        'user1_id', 'user2_id', 'created_at'
+    ).order_by('id')
+    last_id = 0
+    while True:
+        friendships = list(accepted.filter(id__gt=last_id)[:2000])
+        if not friendships:
+            break
+        FriendEdge.objects.bulk_create(
+            [
+                FriendEdge(user_id=a, friend_id=b, friendship_id=friendship.pk, created_at=friendship.created_at)
+                for friendship in friendships
+                for a, b in (
+                    (friendship.user1_id, friendship.user2_id),
+                    (friendship.user2_id, friendship.user1_id),
+                )
+            ],
+            ignore_conflicts=True
+        )
+        last_id = friendships[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0003_friendship_status_message'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FriendEdge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('friend', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('friendship', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='edges', to='friends.friendship')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friend_edges', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'unique_together': {('user', 'friend')},
+            },
+        ),
+        migrations.RunPython(link_accepted, migrations.RunPython.noop),
+    ]
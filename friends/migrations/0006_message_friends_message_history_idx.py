@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0005_suggesteduser'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'receiver', 'created_at', 'id'], name='friends_message_history_idx'),
+        ),
+    ]
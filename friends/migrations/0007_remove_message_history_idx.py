@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-18 14:03
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0006_message_friends_message_history_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='message',
+            name='friends_message_history_idx',
+        ),
+    ]
@@ -60,7 +60,89 @@ class Friendship(models.Model):
         return f"{self.user1.username} - {self.user2.username}"
 
 
+class FriendEdge(models.Model):
+    """One direction of an accepted friendship.
+
+    Every friendship is stored as two mirrored rows, so "is a friends with b"
+    and "friends of a" are single lookups on the ``(user, friend)`` index
+    whichever way round the ``Friendship`` was created.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='friend_edges')
+    friend = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    friendship = models.ForeignKey(Friendship, on_delete=models.CASCADE, related_name='edges')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'friend')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.friend_id}"
+
+    @classmethod
+    def link(cls, friendships):
+        """Add both directions of each accepted friendship in ``friendships``."""
+        cls.objects.bulk_create(
+            [
+                cls(user_id=a, friend_id=b, friendship_id=friendship.pk, created_at=friendship.created_at)
+                for friendship in friendships
+                for a, b in (
+                    (friendship.user1_id, friendship.user2_id),
+                    (friendship.user2_id, friendship.user1_id),
+                )
+            ],
+            ignore_conflicts=True
+        )
+
+    @classmethod
+    def unlink(cls, user_a, user_b):
+        """Remove both directions of the friendship between two users."""
+        cls.objects.filter(user_id__in=[user_a, user_b], friend_id__in=[user_a, user_b]).delete()
+
+    @classmethod
+    def are_friends(cls, user_a, user_b):
+        return cls.objects.filter(user_id=user_a, friend_id=user_b).exists()
+
+    @classmethod
+    def friends_of(cls, user_id):
+        """Ids of a user's friends."""
+        return cls.objects.filter(user_id=user_id).values_list('friend_id', flat=True)
+
+    @classmethod
+    def friendship_between(cls, user_a, user_b):
+        """Id of the ``Friendship`` joining two users, or None."""
+        return cls.objects.filter(
+            user_id=user_a, friend_id=user_b
+        ).values_list('friendship_id', flat=True).first()
+
+
+class SuggestedUser(models.Model):
+    """A precomputed friend suggestion, refreshed by ``refresh_suggestions``."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='suggestions')
+    suggested = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    mutual_friends = models.PositiveIntegerField(default=0)
+    shared_topics = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'suggested')
+        ordering = ['rank']
+        indexes = [
+            models.Index(fields=['user', 'rank'], name='friends_suggestion_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.suggested_id} for {self.user_id} (#{self.rank})"
+
+    @classmethod
+    def forget(cls, user_a, user_b):
+        """Drop the suggestions pairing two users, once they are connected."""
+        cls.objects.filter(user_id__in=[user_a, user_b], suggested_id__in=[user_a, user_b]).delete()
+
+
 class Message(models.Model):
+    """Legacy message table, copied into private_messages by consolidate_messages."""
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='friend_messages_sent')
     receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='friend_messages_received')
     content = models.TextField()
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent once a friendship has been committed, with user_a and user_b ids
+friendship_created = Signal()
+# Sent once a friendship has been deleted, with user_a and user_b ids
+friendship_removed = Signal()
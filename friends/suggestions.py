@@ -0,0 +1,165 @@
+"""Precomputed "people you may know" suggestions.
+
+``refresh_suggestions`` ranks, for every user, the friends of their friends
+and the recent authors of the topics they post in, by mutual friends first
+and shared topics second. Current friends and anyone a friend request
+already exists with (either direction, any status) are left out, and the
+best ``SUGGESTION_LIMIT`` are stored as ``SuggestedUser`` rows. Users with
+too few candidates get the best-connected users as filler. The sidebars
+then read a user's suggestions with one indexed query.
+"""
+import heapq
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from posts.models import PostTopic
+from .graph import label_mutual_friends, social_graph
+from .models import FriendRequest, SuggestedUser
+
+User = get_user_model()
+
+# Suggestions stored per user
+SUGGESTION_LIMIT = getattr(settings, 'FRIEND_SUGGESTION_LIMIT', 20)
+# Days of posts whose topics count as a user's interests
+SUGGESTION_TOPIC_DAYS = getattr(settings, 'FRIEND_SUGGESTION_TOPIC_DAYS', 30)
+# Suggestions shown in a sidebar
+SIDEBAR_SUGGESTIONS = 5
+# A mutual friend is worth this many shared topics
+MUTUAL_FRIEND_WEIGHT = 3
+# Recent authors kept per topic; popular topics would otherwise make every
+# poster a candidate for everyone
+TOPIC_AUTHORS_LIMIT = 200
+# Friends whose friend lists are scanned per user
+FRIENDS_SCANNED = 1000
+# Best-connected users kept as filler
+POPULAR_USERS = 200
+
+
+def score(mutual_friends, shared_topics):
+    return MUTUAL_FRIEND_WEIGHT * mutual_friends + shared_topics
+
+
+def suggested_users(user, limit=SIDEBAR_SUGGESTIONS):
+    """A user's stored suggestions, best first, labelled with mutual friends."""
+    return label_mutual_friends(user, [
+        suggestion.suggested for suggestion in
+        SuggestedUser.objects.filter(user=user).select_related('suggested')[:limit]
+    ])
+
+
+class SuggestionBuilder:
+    """Computes and stores suggestions, one batch of users at a time.
+
+    Topic interests and the best-connected users are read once, when the
+    builder is created, and shared by every batch.
+    """
+
+    def __init__(self, graph=social_graph, since=None):
+        self.graph = graph
+        if since is None:
+            since = timezone.now() - timedelta(days=SUGGESTION_TOPIC_DAYS)
+        # author id -> topic ids, and topic id -> most recent author ids
+        self.author_topics = defaultdict(set)
+        self.topic_authors = defaultdict(list)
+        rows = PostTopic.objects.filter(created_at__gte=since).order_by(
+            '-created_at'
+        ).values_list('post__author_id', 'topic_id').iterator()
+        for author_id, topic_id in rows:
+            if topic_id not in self.author_topics[author_id]:
+                self.author_topics[author_id].add(topic_id)
+                if len(self.topic_authors[topic_id]) < TOPIC_AUTHORS_LIMIT:
+                    self.topic_authors[topic_id].append(author_id)
+
+        degrees = graph.degrees()
+        best = np.argsort(degrees, kind='stable')[::-1][:POPULAR_USERS]
+        self.popular = [int(user_id) for user_id in best if degrees[user_id]]
+
+    def candidates(self, user_id, excluded):
+        """``{candidate id: (mutual friends, shared topics)}`` of one user's best candidates."""
+        mutual = {}
+        friends = self.graph.neighbors(user_id)[:FRIENDS_SCANNED]
+        if len(friends):
+            ids, counts = np.unique(
+                np.concatenate([self.graph.neighbors(friend) for friend in friends]),
+                return_counts=True
+            )
+            mutual = dict(zip(ids.tolist(), counts.tolist()))
+
+        topics = self.author_topics.get(user_id, set())
+        shared = Counter()
+        for topic_id in topics:
+            shared.update(self.topic_authors[topic_id])
+        for candidate in mutual:
+            # Authors past TOPIC_AUTHORS_LIMIT are missing from topic_authors
+            if candidate not in shared and candidate in self.author_topics:
+                shared[candidate] = len(topics & self.author_topics[candidate])
+
+        scores = {
+            candidate: (mutual.get(candidate, 0), shared.get(candidate, 0))
+            for candidate in mutual.keys() | shared.keys()
+            if candidate not in excluded
+        }
+        # Spare candidates stand in for inactive users
+        best = heapq.nsmallest(2 * SUGGESTION_LIMIT, scores, key=lambda candidate: (
+            -score(*scores[candidate]), candidate
+        ))
+        return {candidate: scores[candidate] for candidate in best}
+
+    def rank(self, candidates, excluded, active):
+        """Rows of ``(candidate id, mutual friends, shared topics)``, best first."""
+        scored = [
+            (candidate, mutual, topics)
+            for candidate, (mutual, topics) in candidates.items()
+            if candidate in active
+        ]
+        scored.sort(key=lambda row: (-score(row[1], row[2]), row[0]))
+        best = scored[:SUGGESTION_LIMIT]
+        chosen = {row[0] for row in best}
+        for candidate in self.popular:
+            if len(best) >= SUGGESTION_LIMIT:
+                break
+            if candidate not in chosen and candidate not in excluded and candidate in active:
+                best.append((candidate, 0, 0))
+        return best
+
+    def refresh(self, user_ids):
+        """Replace the stored suggestions of ``user_ids``; returns rows written."""
+        user_ids = list(user_ids)
+        excluded = {user_id: {user_id} for user_id in user_ids}
+        for user_id in user_ids:
+            excluded[user_id].update(self.graph.neighbors(user_id).tolist())
+        requests = FriendRequest.objects.filter(
+            Q(sender_id__in=user_ids) | Q(receiver_id__in=user_ids)
+        ).values_list('sender_id', 'receiver_id')
+        for sender_id, receiver_id in requests:
+            if sender_id in excluded:
+                excluded[sender_id].add(receiver_id)
+            if receiver_id in excluded:
+                excluded[receiver_id].add(sender_id)
+
+        ranked = {user_id: self.candidates(user_id, excluded[user_id]) for user_id in user_ids}
+        active = set(User.objects.filter(
+            id__in=set(self.popular).union(*ranked.values()), is_active=True
+        ).values_list('id', flat=True))
+
+        suggestions = [
+            SuggestedUser(
+                user_id=user_id, suggested_id=candidate, rank=rank,
+                mutual_friends=mutual, shared_topics=topics
+            )
+            for user_id in user_ids
+            for rank, (candidate, mutual, topics) in enumerate(
+                self.rank(ranked[user_id], excluded[user_id], active), 1
+            )
+        ]
+        with transaction.atomic():
+            SuggestedUser.objects.filter(user_id__in=user_ids).delete()
+            SuggestedUser.objects.bulk_create(suggestions)
+        return len(suggestions)
@@ -11,5 +11,6 @@ urlpatterns = [
     path('cancel/<int:request_id>/', views.cancel_request, name='cancel_request'),
     path('remove/<int:friendship_id>/', views.remove_friend, name='remove_friend'),
     path('message/<str:username>/', views.send_message, name='send_message'),
+    path('messages/<str:username>/older/', views.view_messages, {'fragment': True}, name='older_messages'),
     path('messages/<str:username>/', views.view_messages, name='messages'),
 ] 
\ No newline at end of file
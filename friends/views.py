@@ -2,9 +2,14 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.db.models import Q
-from .models import FriendRequest, Friendship, Message
+from django.urls import reverse
+from .models import FriendEdge, FriendRequest, Friendship, SuggestedUser
+from . import signals
 from notifications.models import Notification
+from posts import timeline
+from private_messages.models import Conversation
 
 User = get_user_model()
 
@@ -23,36 +28,15 @@ def friend_list(request):
         status='pending'
     ).select_related('receiver')
 
-    try:
-        # Get accepted friends (both directions)
-        friends_as_user1 = Friendship.objects.filter(
-            user1=request.user,
-            status='accepted'
-        ).select_related('user2')
-
-        friends_as_user2 = Friendship.objects.filter(
-            user2=request.user,
-            status='accepted'
-        ).select_related('user1')
-    except Exception as e:
-        # If status field doesn't exist yet, get all friendships
-        friends_as_user1 = Friendship.objects.filter(
-            user1=request.user
-        ).select_related('user2')
-
-        friends_as_user2 = Friendship.objects.filter(
-            user2=request.user
-        ).select_related('user1')
-
-    # Debug information
-    print("Friends as user1:", [f.user2.username for f in friends_as_user1])
-    print("Friends as user2:", [f.user1.username for f in friends_as_user2])
+    # Get accepted friends (both directions) from the mirrored edges
+    friend_edges = FriendEdge.objects.filter(
+        user=request.user
+    ).select_related('friend')
 
     context = {
         'pending_requests': pending_requests,
         'sent_requests': sent_requests,
-        'friends_as_user1': friends_as_user1,
-        'friends_as_user2': friends_as_user2,
+        'friend_edges': friend_edges,
     }
     return render(request, 'friends/friend_list.html', context)
 
@@ -74,6 +58,7 @@ def send_friend_request(request, username):
         sender=request.user,
         receiver=receiver
     )
+    SuggestedUser.forget(request.user.pk, receiver.pk)
     
     # Create notification for the receiver
     Notification.objects.create(
@@ -97,15 +82,22 @@ def accept_request(request, request_id):
     )
     
     # Create friendship
-    friendship = Friendship.objects.create(
-        user1=friend_request.sender,
-        user2=friend_request.receiver,
-        status='accepted'
-    )
-    
-    # Update friend request status
-    friend_request.status = 'accepted'
-    friend_request.save()
+    with transaction.atomic():
+        friendship = Friendship.objects.create(
+            user1=friend_request.sender,
+            user2=friend_request.receiver,
+            status='accepted'
+        )
+        FriendEdge.link([friendship])
+        User.adjust_friendship_counts(friendship.user1_id, friendship.user2_id, 1)
+        transaction.on_commit(lambda: signals.friendship_created.send(
+            sender=Friendship, user_a=friendship.user1_id, user_b=friendship.user2_id
+        ))
+        
+        # Update friend request status
+        friend_request.status = 'accepted'
+        friend_request.save()
+    timeline.add_author(friendship.user1_id, friendship.user2_id)
     
     # Create notification for the sender
     Notification.objects.create(
@@ -160,7 +152,14 @@ def remove_friend(request, friendship_id):
         messages.error(request, 'You can only remove your own friends.')
         return redirect('friends:friend_list')
     
-    friendship.delete()
+    with transaction.atomic():
+        FriendEdge.unlink(friendship.user1_id, friendship.user2_id)
+        friendship.delete()
+        User.adjust_friendship_counts(friendship.user1_id, friendship.user2_id, -1)
+        transaction.on_commit(lambda: signals.friendship_removed.send(
+            sender=Friendship, user_a=friendship.user1_id, user_b=friendship.user2_id
+        ))
+    timeline.remove_author(friendship.user1_id, friendship.user2_id)
     messages.success(request, 'Friend removed.')
     return redirect('friends:friend_list')
 
@@ -176,21 +175,12 @@ def send_message(request, username):
             return redirect('friends:friend_list')
         
         # Check if users are friends
-        is_friend = Friendship.objects.filter(
-            (Q(user1=request.user, user2=receiver) | Q(user1=receiver, user2=request.user)),
-            status='accepted'
-        ).exists()
-        
-        if not is_friend:
+        if not FriendEdge.are_friends(request.user.pk, receiver.pk):
             messages.error(request, 'You can only message your friends.')
             return redirect('friends:friend_list')
         
         # Create message
-        Message.objects.create(
-            sender=request.user,
-            receiver=receiver,
-            content=content
-        )
+        Conversation.deliver(request.user, receiver, content)
         
         # Create notification
         Notification.objects.create(
@@ -206,30 +196,33 @@ def send_message(request, username):
     return redirect('friends:friend_list')
 
 @login_required
-def view_messages(request, username):
+def view_messages(request, username, fragment=False):
     """View conversation with a friend."""
     friend = get_object_or_404(User, username=username)
     
     # Check if users are friends
-    is_friend = Friendship.objects.filter(
-        (Q(user1=request.user, user2=friend) | Q(user1=friend, user2=request.user)),
-        status='accepted'
-    ).exists()
-    
-    if not is_friend:
+    if not FriendEdge.are_friends(request.user.pk, friend.pk):
         messages.error(request, 'You can only view messages from your friends.')
         return redirect('friends:friend_list')
     
-    # Get messages between users
-    messages = Message.objects.filter(
-        (Q(sender=request.user, receiver=friend) | Q(sender=friend, receiver=request.user))
-    ).order_by('created_at')
-    
-    # Mark messages as read
-    Message.objects.filter(receiver=request.user, sender=friend, is_read=False).update(is_read=True)
+    # Newest page first; older pages come from the older_messages fragment
+    conversation = Conversation.find(request.user.pk, friend.pk)
+    page, older_cursor = [], None
+    if conversation is not None:
+        page, older_cursor = conversation.history(request.GET.get('cursor'))
     
     context = {
         'friend': friend,
-        'messages': messages,
+        'messages': page,
+        'older_cursor': older_cursor,
+        'older_url': reverse('friends:older_messages', kwargs={'username': username}),
     }
-    return render(request, 'friends/messages.html', context) 
\ No newline at end of file
+    if fragment:
+        context['message_template'] = 'friends/includes/message.html'
+        return render(request, 'private_messages/message_page.html', context)
+
+    # Mark messages as read
+    if conversation is not None:
+        conversation.mark_read(request.user)
+    
+    return render(request, 'friends/messages.html', context)
@@ -5,8 +5,9 @@ from django.utils import timezone
 User = get_user_model()
 
 class Message(models.Model):
-    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
-    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_messages')
+    """Legacy message table, copied into private_messages by consolidate_messages."""
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='legacy_sent_messages')
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='legacy_received_messages')
     content = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
     is_read = models.BooleanField(default=False)
@@ -7,4 +7,5 @@ urlpatterns = [
     path('', views.inbox, name='inbox'),
     path('send/<str:username>/', views.send_message, name='send_message'),
     path('conversation/<str:username>/', views.conversation, name='conversation'),
+    path('conversation/<str:username>/older/', views.conversation, {'fragment': True}, name='older_messages'),
 ] 
\ No newline at end of file
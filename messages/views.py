@@ -1,21 +1,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
-from django.db.models import Q
-from .models import Message
+from django.urls import reverse
+from private_messages.models import Conversation, ConversationParticipant
 
 User = get_user_model()
 
 @login_required
 def inbox(request):
-    messages = Message.objects.filter(
-        Q(sender=request.user) | Q(recipient=request.user)
-    ).order_by('-created_at')
+    # One indexed query over the user's participant rows
+    conversations = ConversationParticipant.inbox(request.user)
     
-    # Mark messages as read
-    Message.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
-    
-    return render(request, 'messages/inbox.html', {'messages': messages})
+    return render(request, 'messages/inbox.html', {'conversations': conversations})
 
 @login_required
 def send_message(request, username):
@@ -24,37 +20,39 @@ def send_message(request, username):
     if request.method == 'POST':
         content = request.POST.get('content')
         if content:
-            Message.objects.create(
-                sender=request.user,
-                recipient=recipient,
-                content=content
-            )
+            Conversation.deliver(request.user, recipient, content)
             return redirect('messages:inbox')
     
     return render(request, 'messages/send_message.html', {'recipient': recipient})
 
 @login_required
-def conversation(request, username):
+def conversation(request, username, fragment=False):
     other_user = get_object_or_404(User, username=username)
-    messages = Message.objects.filter(
-        (Q(sender=request.user) & Q(recipient=other_user)) |
-        (Q(sender=other_user) & Q(recipient=request.user))
-    ).order_by('created_at')
     
-    # Mark messages as read
-    Message.objects.filter(recipient=request.user, sender=other_user, is_read=False).update(is_read=True)
-    
-    if request.method == 'POST':
+    if request.method == 'POST' and not fragment:
         content = request.POST.get('content')
         if content:
-            Message.objects.create(
-                sender=request.user,
-                recipient=other_user,
-                content=content
-            )
+            Conversation.deliver(request.user, other_user, content)
             return redirect('messages:conversation', username=username)
     
-    return render(request, 'messages/conversation.html', {
+    # Newest page first; older pages come from the older_messages fragment
+    conversation = Conversation.find(request.user.pk, other_user.pk)
+    messages, older_cursor = [], None
+    if conversation is not None:
+        messages, older_cursor = conversation.history(request.GET.get('cursor'))
+    
+    context = {
         'messages': messages,
-        'other_user': other_user
-    }) 
\ No newline at end of file
+        'other_user': other_user,
+        'older_cursor': older_cursor,
+        'older_url': reverse('messages:older_messages', kwargs={'username': username}),
+    }
+    if fragment:
+        context['message_template'] = 'messages/includes/message.html'
+        return render(request, 'private_messages/message_page.html', context)
+
+    # Mark messages as read
+    if conversation is not None:
+        conversation.mark_read(request.user)
+    
+    return render(request, 'messages/conversation.html', context)
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class NotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'notifications' 
\ No newline at end of file
+    name = 'notifications'
+
+    def ready(self):
+        # Connects the receivers that publish new rows to the live stream
+        from . import events  # noqa: F401
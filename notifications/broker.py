@@ -0,0 +1,210 @@
+"""In-process pub/sub for live message and notification events.
+
+Views publish events for a user with ``broker.publish``; every open
+``notifications:stream`` connection of that user receives them. Each
+connection is one coroutine waiting on its own ``asyncio.Queue``, so an idle
+connection costs a queue and a few kilobytes, never a thread. Publishing is
+safe from any thread: sync views run in a worker thread under ASGI, and
+events are handed to the subscriber's event loop with
+``call_soon_threadsafe``.
+
+How events reach other worker processes is up to the backend named by
+``EVENT_BROKER_BACKEND``:
+
+- ``LocalBackend`` delivers within the publishing process only, which is
+  all a single ASGI worker needs.
+- ``SQLiteBackend`` appends events to a shared SQLite file
+  (``EVENT_BROKER_PATH``) that one coroutine per worker polls every
+  ``EVENT_BROKER_POLL_INTERVAL`` seconds, so workers on one machine see
+  each other's events.
+
+A backend is any class with ``publish(event)`` and ``start(broker)``;
+``start`` is called from the event loop when its first subscriber arrives.
+"""
+import asyncio
+import itertools
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+BACKEND = getattr(settings, 'EVENT_BROKER_BACKEND', 'notifications.broker.LocalBackend')
+BROKER_PATH = getattr(settings, 'EVENT_BROKER_PATH', settings.BASE_DIR / 'events.sqlite3')
+POLL_INTERVAL = getattr(settings, 'EVENT_BROKER_POLL_INTERVAL', 0.5)
+# Events kept in the SQLite channel for workers that poll late
+RETENTION_SECONDS = 60
+# Undelivered events held per connection before the oldest are dropped
+QUEUE_SIZE = 100
+
+
+@dataclass
+class Event:
+    user_id: int
+    kind: str
+    data: dict
+    id: int = None
+
+    def encode(self):
+        """The event as a server-sent events frame."""
+        lines = [f'event: {self.kind}', f'data: {json.dumps(self.data)}']
+        if self.id is not None:
+            lines.insert(0, f'id: {self.id}')
+        return '\n'.join(lines) + '\n\n'
+
+
+@dataclass(eq=False)
+class Subscription:
+    user_id: int
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(QUEUE_SIZE))
+
+    def put(self, event):
+        # Runs on the subscriber's loop; a stalled client loses its oldest events
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class Broker:
+    """Routes published events to the subscriptions of their user."""
+
+    def __init__(self, backend=None):
+        self.backend = backend or import_string(BACKEND)()
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, user_id):
+        """Start receiving a user's events; call from a running event loop."""
+        subscription = Subscription(user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        self.backend.start(self)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscribers.pop(subscription.user_id, None)
+
+    def has_subscribers(self):
+        with self._lock:
+            return bool(self._subscribers)
+
+    def publish(self, user_id, kind, data):
+        self.backend.publish(Event(user_id, kind, data))
+
+    def dispatch(self, event):
+        """Hand an event to every subscription of its user, in this process."""
+        with self._lock:
+            subscriptions = list(self._subscribers.get(event.user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self.unsubscribe(subscription)
+
+
+class LocalBackend:
+    """Delivers events to subscribers in the publishing process."""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self.broker = None
+
+    def start(self, broker):
+        self.broker = broker
+
+    def publish(self, event):
+        if self.broker is not None:
+            event.id = next(self._ids)
+            self.broker.dispatch(event)
+
+
+class SQLiteBackend:
+    """Shares events between the worker processes of one machine.
+
+    Publishing appends a row to the channel file; each worker runs a single
+    polling coroutine, while it has subscribers, that dispatches rows newer
+    than the last one it saw. Reads are primary key range scans, and WAL
+    mode keeps them from waiting on writers.
+    """
+
+    def __init__(self, path=BROKER_PATH, poll_interval=POLL_INTERVAL):
+        self.path = str(path)
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._pollers = {}
+        self._lock = threading.Lock()
+        self._pruned_at = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS events ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, '
+                'kind TEXT NOT NULL, data TEXT NOT NULL, created REAL NOT NULL)'
+            )
+            self._local.connection = connection
+        return connection
+
+    def publish(self, event):
+        connection = self._connection()
+        connection.execute(
+            'INSERT INTO events (user_id, kind, data, created) VALUES (?, ?, ?, ?)',
+            (event.user_id, event.kind, json.dumps(event.data), time.time())
+        )
+        if time.time() - self._pruned_at > RETENTION_SECONDS:
+            self._pruned_at = time.time()
+            connection.execute(
+                'DELETE FROM events WHERE created < ?', (time.time() - RETENTION_SECONDS,)
+            )
+
+    def start(self, broker):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            poller = self._pollers.get(loop)
+            if poller is None or poller.done():
+                self._pollers[loop] = loop.create_task(self.poll(broker))
+
+    def _read(self, after):
+        return self._connection().execute(
+            'SELECT id, user_id, kind, data FROM events WHERE id > ? ORDER BY id', (after,)
+        ).fetchall()
+
+    async def poll(self, broker):
+        last_id = self._connection().execute(
+            'SELECT COALESCE(MAX(id), 0) FROM events'
+        ).fetchone()[0]
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            # Decided under the lock start() takes, so a subscriber arriving
+            # now either sees this poller running or starts a new one
+            with self._lock:
+                if not broker.has_subscribers():
+                    self._pollers.pop(loop, None)
+                    return
+            try:
+                rows = self._read(last_id)
+            except sqlite3.OperationalError:
+                # Locked by a writer for longer than the timeout; retry next tick
+                continue
+            for row_id, user_id, kind, data in rows:
+                last_id = row_id
+                broker.dispatch(Event(user_id, kind, json.loads(data), row_id))
+
+
+broker = Broker()
@@ -0,0 +1,6 @@
+from django.conf import settings
+
+
+def live_events(request):
+    """Whether pages should open the live event stream (ASGI deployments only)."""
+    return {'live_events': getattr(settings, 'EVENT_STREAM_ENABLED', False)}
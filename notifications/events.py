@@ -0,0 +1,59 @@
+"""Publishes new private messages and notifications to the live stream.
+
+Events are published once the row's transaction commits, so a client never
+hears about a row it can't read yet. A failing broker is logged and never
+fails the request that saved the row.
+"""
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from private_messages.models import Message
+from .broker import broker
+from .models import Notification
+
+
+def message_event(message):
+    return {
+        'id': message.pk,
+        'sender': message.sender.username,
+        'recipient': message.recipient.username,
+        'content': message.content,
+        'created_at': message.created_at.isoformat(),
+    }
+
+
+def notification_event(notification):
+    return {
+        'id': notification.pk,
+        'type': notification.notification_type,
+        'message': notification.message,
+        'link': notification.link or reverse('notifications:list'),
+        'sender': notification.sender.username if notification.sender_id else None,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+@receiver(post_save, sender=Message, dispatch_uid='notifications.events.message_saved')
+def message_saved(sender, instance, created, **kwargs):
+    if not created:
+        return
+    data = message_event(instance)
+
+    def publish():
+        # The sender's other open pages show it too
+        for user_id in {instance.recipient_id, instance.sender_id}:
+            broker.publish(user_id, 'message', data)
+
+    transaction.on_commit(publish, robust=True)
+
+
+@receiver(post_save, sender=Notification, dispatch_uid='notifications.events.notification_saved')
+def notification_saved(sender, instance, created, **kwargs):
+    if not created:
+        return
+    data = notification_event(instance)
+    transaction.on_commit(
+        lambda: broker.publish(instance.recipient_id, 'notification', data), robust=True
+    )
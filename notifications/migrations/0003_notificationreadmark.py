@@ -0,0 +1,50 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Min
+from django.utils import timezone
+
+
+def set_watermarks(apps, schema_editor):
+    # Read up to just before each user's first unread notification, or everything
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationReadMark = apps.get_model('notifications', 'NotificationReadMark')
+    first_unread = dict(
+        Notification.objects.filter(is_read=False).order_by().values('recipient_id')
+        .annotate(first=Min('id')).values_list('recipient_id', 'first')
+    )
+    now = timezone.now()
+    NotificationReadMark.objects.bulk_create(
+        [
+            NotificationReadMark(
+                user_id=user_id,
+                last_notification_id=first_unread[user_id] - 1 if user_id in first_unread else last,
+                updated_at=now
+            )
+            for user_id, last in Notification.objects.order_by().values('recipient_id')
+            .annotate(last=Max('id')).values_list('recipient_id', 'last')
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_customuser_relationship_counts'),
+        ('notifications', '0002_notification_link_alter_notification_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationReadMark',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_read_mark', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last_notification_id', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(set_watermarks, migrations.RunPython.noop),
+    ]
@@ -29,4 +29,38 @@ class Notification(models.Model):
         app_label = 'notifications'
 
     def __str__(self):
-        return f'Notification for {self.recipient.username}' 
\ No newline at end of file
+        return f'Notification for {self.recipient.username}'
+
+
+class NotificationReadMark(models.Model):
+    """Notifications up to ``last_notification_id`` have been read by ``user``."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='notification_read_mark'
+    )
+    last_notification_id = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'notifications'
+
+    def __str__(self):
+        return f'{self.user_id} read notifications up to {self.last_notification_id}'
+
+    @classmethod
+    def last_read_id(cls, user):
+        return cls.objects.filter(user=user).values_list(
+            'last_notification_id', flat=True
+        ).first() or 0
+
+    @classmethod
+    def read_through(cls, user, notification_id):
+        """Set a user's watermark with a single-row upsert."""
+        cls.objects.bulk_create(
+            [cls(user=user, last_notification_id=notification_id, updated_at=timezone.now())],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['last_notification_id', 'updated_at']
+        )
@@ -7,4 +7,5 @@ urlpatterns = [
     path('', views.notification_list, name='list'),
     path('mark-all-read/', views.mark_all_read, name='mark_all_read'),
     path('mark-read/<int:notification_id>/', views.mark_read, name='mark_read'),
+    path('stream/', views.stream, name='stream'),
 ] 
\ No newline at end of file
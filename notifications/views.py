@@ -1,19 +1,35 @@
+import asyncio
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Max
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from .models import Notification
+from django.http import HttpResponse, StreamingHttpResponse
+from .broker import broker
+from .models import Notification, NotificationReadMark
+
+# Off unless served by an ASGI server
+STREAM_ENABLED = getattr(settings, 'EVENT_STREAM_ENABLED', False)
+# Seconds between comments that keep idle streams open through proxies
+STREAM_KEEPALIVE = getattr(settings, 'EVENT_STREAM_KEEPALIVE', 15)
+# Seconds before a stream ends; the browser then reconnects
+STREAM_LIFETIME = getattr(settings, 'EVENT_STREAM_LIFETIME', 300)
 
 
 @login_required
 def notification_list(request):
-    notifications = Notification.objects.filter(
+    notifications = list(Notification.objects.filter(
         recipient=request.user
-    ).order_by('-created_at')
+    ).select_related('sender').order_by('-created_at'))
     
-    # Mark notifications as read
-    Notification.objects.filter(
-        recipient=request.user,
-        is_read=False
-    ).update(is_read=True)
+    # Unread is anything past the watermark; moving it is one upsert
+    last_read_id = NotificationReadMark.last_read_id(request.user)
+    for notification in notifications:
+        notification.is_unread = notification.id > last_read_id and not notification.is_read
+    newest_id = max((notification.id for notification in notifications), default=0)
+    if newest_id > last_read_id:
+        NotificationReadMark.read_through(request.user, newest_id)
     
     return render(request, 'notifications/list.html', {
         'notifications': notifications
@@ -22,10 +38,11 @@ def notification_list(request):
 
 @login_required
 def mark_all_read(request):
-    Notification.objects.filter(
-        recipient=request.user,
-        is_read=False
-    ).update(is_read=True)
+    newest_id = Notification.objects.filter(
+        recipient=request.user
+    ).aggregate(newest=Max('id'))['newest']
+    if newest_id:
+        NotificationReadMark.read_through(request.user, newest_id)
     return redirect('notifications:list')
 
 
@@ -37,5 +54,46 @@ def mark_read(request, notification_id):
         recipient=request.user
     )
     notification.is_read = True
-    notification.save()
-    return redirect('notifications:list') 
\ No newline at end of file
+    notification.save(update_fields=['is_read'])
+    return redirect('notifications:list')
+
+
+async def event_stream(user_id, lifetime=STREAM_LIFETIME):
+    subscription = broker.subscribe(user_id)
+    deadline = asyncio.get_running_loop().time() + lifetime
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return
+            try:
+                event = await asyncio.wait_for(
+                    subscription.get(), min(STREAM_KEEPALIVE, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield event.encode()
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def stream(request):
+    """Server-sent events of the user's new messages and notifications.
+
+    Each open stream is one coroutine on the server's event loop, and ends
+    after ``EVENT_STREAM_LIFETIME`` seconds so the browser reconnects.
+    Under WSGI, or with ``EVENT_STREAM_ENABLED`` off, it answers 204, which
+    tells the browser to stop reconnecting.
+    """
+    if not STREAM_ENABLED or not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    response = StreamingHttpResponse(event_stream(user.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stops nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Post, Comment
+from . import hashtags, timeline
 
 
 @admin.register(Post)
@@ -12,6 +13,11 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ('content', 'author__username')
     ordering = ('-created_at',)
     
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        hashtags.index_post(obj)
+        timeline.fan_out_post(obj)
+    
     def content_preview(self, obj):
         return (
             obj.content[:50] + '...' 
@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'posts' 
\ No newline at end of file
+    name = 'posts'
+
+    def ready(self):
+        # Connects the receivers that keep the autocomplete indexes current
+        from . import autocomplete  # noqa: F401 
\ No newline at end of file
@@ -0,0 +1,185 @@
+"""In-process prefix indexes for #hashtag and @mention completion.
+
+Topic names and usernames are kept in sorted arrays, so the entries
+completing a prefix are one contiguous slice found with two binary searches.
+Topics are ranked by their posts in the trending window, usernames by
+whether the viewer is friends with them.
+
+Each process builds the indexes on first use, adds topics and users as they
+are created, and rebuilds them every ``AUTOCOMPLETE_REBUILD_INTERVAL``
+seconds to pick up entries created by other processes. Results per prefix
+are cached for ``AUTOCOMPLETE_CACHE_TIMEOUT`` seconds.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import timeline, trending
+from .models import Topic, TopicBucket
+
+User = get_user_model()
+
+# Seconds between full rebuilds of each process's indexes
+AUTOCOMPLETE_REBUILD_INTERVAL = getattr(settings, 'AUTOCOMPLETE_REBUILD_INTERVAL', 600)
+# Seconds the completions of a prefix stay cached
+AUTOCOMPLETE_CACHE_TIMEOUT = getattr(settings, 'AUTOCOMPLETE_CACHE_TIMEOUT', 60)
+# Suggestions returned per request
+AUTOCOMPLETE_LIMIT = 8
+# Entries of a prefix slice ranked at most; very short prefixes match a lot
+MAX_SCAN = 5000
+
+TOPIC_KEY = 'autocomplete:topic:{}'
+USER_KEY = 'autocomplete:user:{}'
+FRIENDS_KEY = 'autocomplete:friends:{}'
+
+
+class PrefixIndex:
+    """Sorted array of lowercase keys, each with a label and a weight."""
+
+    def __init__(self, loader):
+        # loader() returns an iterable of (label, weight)
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._keys = []
+        # key -> [label, weight]
+        self._entries = {}
+        self._built_at = None
+
+    def _ensure_built(self):
+        if (
+            self._built_at is not None
+            and time.monotonic() - self._built_at < AUTOCOMPLETE_REBUILD_INTERVAL
+        ):
+            return
+        entries = {label.lower(): [label, weight] for label, weight in self.loader()}
+        with self._lock:
+            self._entries = entries
+            self._keys = sorted(entries)
+            self._built_at = time.monotonic()
+
+    def add(self, label, weight=0):
+        """Insert ``label``, or add ``weight`` to it if already present."""
+        key = label.lower()
+        with self._lock:
+            if self._built_at is None:
+                # The first build will read it from the database
+                return
+            if key not in self._entries:
+                insort(self._keys, key)
+                self._entries[key] = [label, 0]
+            self._entries[key][1] += weight
+
+    def complete(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        """Labels of the heaviest keys starting with ``prefix``, heaviest first.
+
+        Only the first ``MAX_SCAN`` keys of the prefix range are ranked.
+        """
+        prefix = prefix.lower()
+        self._ensure_built()
+        with self._lock:
+            start = bisect_left(self._keys, prefix)
+            end = bisect_left(
+                self._keys, prefix + '\U0010ffff', start, min(len(self._keys), start + MAX_SCAN)
+            )
+            best = heapq.nsmallest(
+                limit,
+                self._keys[start:end],
+                key=lambda key: (-self._entries[key][1], len(key), key)
+            )
+            return [self._entries[key][0] for key in best]
+
+
+def topic_weights():
+    since = timezone.now() - timedelta(hours=trending.TRENDING_WINDOW_HOURS)
+    recent = dict(
+        TopicBucket.objects.filter(hour__gte=since).values('topic_id').annotate(
+            total=Sum('count')
+        ).values_list('topic_id', 'total')
+    )
+    for topic_id, name in Topic.objects.values_list('id', 'name').iterator():
+        yield name, recent.get(topic_id, 0)
+
+
+def username_weights():
+    for username in User.objects.filter(is_active=True).values_list('username', flat=True).iterator():
+        yield username, 0
+
+
+topics = PrefixIndex(topic_weights)
+usernames = PrefixIndex(username_weights)
+
+
+def topic_used(name, count=1):
+    """Record ``count`` new uses of a topic, creating it in the index if needed."""
+    topics.add(name, count)
+    forget_prefixes(TOPIC_KEY, name)
+
+
+def complete_topics(prefix, limit=AUTOCOMPLETE_LIMIT):
+    """Topic names completing ``prefix``, most used recently first."""
+    prefix = prefix.lower()
+    key = TOPIC_KEY.format(prefix)
+    names = cache.get(key)
+    if names is None:
+        names = topics.complete(prefix, limit)
+        cache.set(key, names, AUTOCOMPLETE_CACHE_TIMEOUT)
+    return names
+
+
+def friend_usernames(user_id):
+    """A user's friends as sorted ``(lowercase username, username)`` pairs."""
+    key = FRIENDS_KEY.format(user_id)
+    names = cache.get(key)
+    if names is None:
+        friend_ids = set(timeline.following_of(user_id)) | set(timeline.followers_of(user_id))
+        names = sorted(
+            (username.lower(), username) for username in
+            User.objects.filter(id__in=friend_ids).values_list('username', flat=True)
+        )
+        cache.set(key, names, AUTOCOMPLETE_CACHE_TIMEOUT)
+    return names
+
+
+def complete_usernames(prefix, viewer=None, limit=AUTOCOMPLETE_LIMIT):
+    """Usernames completing ``prefix``, the viewer's friends first."""
+    prefix = prefix.lower()
+    friends = []
+    if viewer is not None and viewer.is_authenticated:
+        names = friend_usernames(viewer.pk)
+        start = bisect_left(names, (prefix,))
+        friends = [
+            username for key, username in names[start:start + limit] if key.startswith(prefix)
+        ]
+
+    key = USER_KEY.format(prefix)
+    others = cache.get(key)
+    if others is None:
+        others = usernames.complete(prefix, 2 * limit)
+        cache.set(key, others, AUTOCOMPLETE_CACHE_TIMEOUT)
+    shown = set(friends)
+    if viewer is not None and viewer.is_authenticated:
+        shown.add(viewer.username)
+    return (friends + [name for name in others if name not in shown])[:limit]
+
+
+def forget_prefixes(template, name):
+    """Drop the cached completions of every prefix of ``name``."""
+    name = name.lower()
+    cache.delete_many([template.format(name[:length]) for length in range(1, len(name) + 1)])
+
+
+@receiver(post_save, sender=User, dispatch_uid='posts.autocomplete.user_saved')
+def user_saved(sender, instance, created, **kwargs):
+    if created and instance.is_active:
+        usernames.add(instance.username)
+        forget_prefixes(USER_KEY, instance.username)
@@ -0,0 +1,100 @@
+"""Hashtag extraction and topic indexing shared by every post write path.
+
+Indexing a batch of posts costs a fixed handful of queries however many
+hashtags they carry: missing ``Topic`` rows are created with one
+``bulk_create`` and the ``PostTopic`` links are diffed and written in bulk,
+adjusting each topic's ``post_count`` and hourly trending bucket by the net
+change. Tags newly linked to fresh posts are also fed to the live trending
+sketch and the hashtag autocomplete index.
+"""
+import re
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import autocomplete, sketch, trending
+from .models import PostTopic, Topic
+
+HASHTAG_RE = re.compile(r'#(\w+)')
+MAX_TOPIC_LENGTH = Topic._meta.get_field('name').max_length
+
+
+def extract_hashtags(content):
+    """Lowercased hashtag names in ``content``, in order of first use."""
+    names = {}
+    for match in HASHTAG_RE.finditer(content or ''):
+        names.setdefault(match.group(1).lower()[:MAX_TOPIC_LENGTH], None)
+    return list(names)
+
+
+def index_posts(posts):
+    """Bring the topics of ``posts`` in line with their content.
+
+    Returns the ``(post_id, topic_id)`` pairs that were newly linked.
+    """
+    posts = [post for post in posts if post.pk]
+    if not posts:
+        return []
+    tags = {post.pk: extract_hashtags(post.content) for post in posts}
+    dates = {post.pk: post.created_at for post in posts}
+    names = {name for post_tags in tags.values() for name in post_tags}
+
+    with transaction.atomic():
+        topic_ids = {}
+        if names:
+            Topic.objects.bulk_create(
+                [Topic(name=name) for name in names],
+                ignore_conflicts=True
+            )
+            topic_ids = dict(
+                Topic.objects.filter(name__in=names).values_list('name', 'id')
+            )
+
+        wanted = {
+            (post_id, topic_ids[name])
+            for post_id, post_tags in tags.items()
+            for name in post_tags
+        }
+        current = set(
+            PostTopic.objects.filter(post_id__in=tags).values_list('post_id', 'topic_id')
+        )
+
+        added = wanted - current
+        PostTopic.objects.bulk_create(
+            [
+                PostTopic(post_id=post_id, topic_id=topic_id, created_at=dates[post_id])
+                for post_id, topic_id in added
+            ],
+            ignore_conflicts=True
+        )
+        deltas = Counter(topic_id for post_id, topic_id in added)
+        hourly = Counter((topic_id, dates[post_id]) for post_id, topic_id in added)
+        stale = defaultdict(list)
+        for post_id, topic_id in current - wanted:
+            stale[post_id].append(topic_id)
+            deltas[topic_id] -= 1
+            hourly[topic_id, dates[post_id]] -= 1
+        for post_id, topic_ids_to_drop in stale.items():
+            PostTopic.objects.filter(post_id=post_id, topic_id__in=topic_ids_to_drop).delete()
+        Topic.adjust_counts(deltas)
+        trending.record(hourly)
+
+    # Backfills of old posts must not look like a burst of new tags
+    fresh_since = timezone.now() - timedelta(seconds=sketch.HALF_LIFE_SECONDS)
+    topic_names = {topic_id: name for name, topic_id in topic_ids.items()}
+    fresh = [
+        topic_names[topic_id] for post_id, topic_id in sorted(added)
+        if dates[post_id] >= fresh_since
+    ]
+    sketch.trending_sketch.record(fresh)
+    uses = Counter(fresh)
+    for name in {topic_names[topic_id] for post_id, topic_id in added}:
+        autocomplete.topic_used(name, uses[name])
+    return sorted(added)
+
+
+def index_post(post):
+    """Index the hashtags of a single post."""
+    return index_posts([post])
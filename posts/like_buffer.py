@@ -0,0 +1,232 @@
+"""Write-behind buffering of like toggles.
+
+With ``POSTS_BUFFERED_LIKES`` enabled, toggles are recorded in an in-process
+ledger instead of writing ``posts_post_likes`` directly. The ledger keeps only
+the latest state per (user, post), and writes everything in one transaction
+with ``bulk_create`` and bulk deletes when it reaches
+``LIKE_BUFFER_MAX_PENDING`` entries or ``LIKE_BUFFER_FLUSH_INTERVAL``
+seconds after the first unflushed toggle. A viral post then costs one write
+per flush instead of one per click.
+
+Reads go through ``overlay`` so a user sees their own toggle immediately,
+before it has been flushed.
+
+Toggles on posts or users deleted before the flush are dropped. A batch that
+still fails to write is logged and retried with the next flush, up to
+``LIKE_BUFFER_MAX_ATTEMPTS`` times per toggle before the toggle is discarded,
+so one bad entry can't keep every later flush failing.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+BUFFERED_LIKES = getattr(settings, 'POSTS_BUFFERED_LIKES', False)
+FLUSH_INTERVAL = getattr(settings, 'LIKE_BUFFER_FLUSH_INTERVAL', 1.0)
+MAX_PENDING = getattr(settings, 'LIKE_BUFFER_MAX_PENDING', 500)
+# Failed flushes a toggle survives before it is discarded
+MAX_ATTEMPTS = getattr(settings, 'LIKE_BUFFER_MAX_ATTEMPTS', 3)
+
+
+class LikeLedger:
+    """Thread-safe ledger of unflushed like toggles."""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING,
+                 max_attempts=MAX_ATTEMPTS):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # (user_id, post_id) -> (liked before buffering, liked now)
+        self._pending = {}
+        # Entries taken by a flush that has not committed yet
+        self._inflight = {}
+        # (user_id, post_id) -> failed flushes of the entry so far
+        self._attempts = {}
+        self._timer = None
+
+    def _state(self, key):
+        return self._pending.get(key) or self._inflight.get(key)
+
+    def toggle(self, user_id, post_id):
+        """Record a like toggle and return whether the post is now liked."""
+        key = (user_id, post_id)
+        with self._lock:
+            entry = self._state(key)
+        if entry is None:
+            liked = Post.like_rows(user_id).filter(post_id=post_id).exists()
+            entry = (liked, liked)
+
+        with self._lock:
+            baseline, liked = self._state(key) or entry
+            self._pending[key] = (baseline, not liked)
+            full = len(self._pending) >= self.max_pending
+            if not full:
+                self._schedule()
+
+        if full:
+            self.flush()
+        return not liked
+
+    def is_liked(self, user_id, post_id):
+        """The buffered like state of ``user_id`` on ``post_id``, or None."""
+        with self._lock:
+            entry = self._state((user_id, post_id))
+        return None if entry is None else entry[1]
+
+    def count_deltas(self, post_ids=None):
+        """Net unflushed like count change per post."""
+        deltas = Counter()
+        with self._lock:
+            entries = {**self._inflight, **self._pending}
+        for (user_id, post_id), (baseline, liked) in entries.items():
+            if baseline != liked and (post_ids is None or post_id in post_ids):
+                deltas[post_id] += 1 if liked else -1
+        return deltas
+
+    def flush(self):
+        """Write all pending toggles to the database.
+
+        Returns the number of through-table rows inserted or deleted. A failed
+        write is logged rather than raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                self._inflight, self._pending = self._pending, {}
+                batch = self._inflight
+            if not batch:
+                return 0
+            try:
+                written = self._write(batch)
+            except Exception:
+                logger.exception('like buffer flush of %d toggles failed', len(batch))
+                self._requeue(batch)
+                return 0
+            with self._lock:
+                self._inflight = {}
+                for key in batch:
+                    self._attempts.pop(key, None)
+            return written
+
+    def _requeue(self, batch):
+        """Put a failed batch back for the next flush, minus worn-out entries."""
+        with self._lock:
+            dropped = 0
+            for key, entry in batch.items():
+                attempts = self._attempts.get(key, 0) + 1
+                if attempts >= self.max_attempts:
+                    self._attempts.pop(key, None)
+                    dropped += 1
+                    continue
+                self._attempts[key] = attempts
+                # Toggles made since the batch was taken are newer and win
+                self._pending.setdefault(key, entry)
+            self._inflight = {}
+            if self._pending:
+                self._schedule()
+        if dropped:
+            logger.error('like buffer discarded %d toggles after %d failed flushes',
+                         dropped, self.max_attempts)
+
+    def _schedule(self):
+        # Caller holds the lock
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _write(self, batch):
+        through = Post.likes.through
+        user_field = f'{Post.likes.field.m2m_reverse_field_name()}_id'
+        user_ids = {user_id for user_id, post_id in batch}
+        post_ids = {post_id for user_id, post_id in batch}
+        # Posts or users deleted since the toggle can't be liked any more
+        live_posts = set(Post.objects.filter(pk__in=post_ids).values_list('pk', flat=True))
+        live_users = set(Post.likes.field.related_model.objects.filter(
+            pk__in=user_ids
+        ).values_list('pk', flat=True))
+
+        # The real current state decides what each toggle changes, so a stale
+        # baseline or a like written by another process never skews counts
+        existing = set(through.objects.filter(
+            post_id__in=post_ids,
+            **{f'{user_field}__in': user_ids}
+        ).values_list(user_field, 'post_id'))
+        added = [
+            (user_id, post_id) for (user_id, post_id), (baseline, liked) in batch.items()
+            if liked and (user_id, post_id) not in existing
+            and post_id in live_posts and user_id in live_users
+        ]
+        removed = defaultdict(list)
+        for (user_id, post_id), (baseline, liked) in batch.items():
+            if not liked and (user_id, post_id) in existing:
+                removed[post_id].append(user_id)
+
+        deltas = Counter()
+        with transaction.atomic():
+            through.objects.bulk_create(
+                [through(post_id=post_id, **{user_field: user_id}) for user_id, post_id in added],
+                ignore_conflicts=True
+            )
+            for user_id, post_id in added:
+                deltas[post_id] += 1
+            for post_id, unliked_by in removed.items():
+                through.objects.filter(
+                    post_id=post_id,
+                    **{f'{user_field}__in': unliked_by}
+                ).delete()
+                deltas[post_id] -= len(unliked_by)
+            for post_id, delta in deltas.items():
+                Post.adjust_counts(post_id, likes=delta)
+        return len(added) + sum(len(users) for users in removed.values())
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # Timer threads are short-lived; don't leak their connections
+            connections.close_all()
+
+
+ledger = LikeLedger()
+atexit.register(ledger.flush)
+
+
+def toggle_like(post, user):
+    """Toggle ``user``'s like on ``post`` directly or through the ledger.
+
+    Returns ``(liked, like_count)`` as the user should see them.
+    """
+    if not BUFFERED_LIKES:
+        liked = Post.toggle_like(post.pk, user.pk)
+        post.refresh_from_db(fields=['like_count'])
+        return liked, post.like_count
+
+    liked = ledger.toggle(user.pk, post.pk)
+    post.refresh_from_db(fields=['like_count'])
+    return liked, post.like_count + ledger.count_deltas({post.pk})[post.pk]
+
+
+def overlay(posts, user):
+    """Apply unflushed toggles to posts annotated by ``with_viewer_state``."""
+    if not BUFFERED_LIKES:
+        return posts
+    deltas = ledger.count_deltas({post.pk for post in posts})
+    for post in posts:
+        post.like_count += deltas[post.pk]
+        if user.is_authenticated:
+            liked = ledger.is_liked(user.pk, post.pk)
+            if liked is not None:
+                post.is_liked_by_user = liked
+    return posts
@@ -0,0 +1,80 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connections
+from posts.models import Post
+from posts.like_buffer import LikeLedger
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = 'Compare synchronous and buffered like throughput on a single hot post'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent likers')
+        parser.add_argument('--toggles', type=int, default=200, help='Toggles per thread')
+        parser.add_argument('--users-per-thread', type=int, default=10, help='Distinct users per thread')
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        toggles = options['toggles']
+        users_per_thread = options['users_per_thread']
+
+        User.objects.bulk_create([
+            User(username=f'bench_liker_{i}', mobile_number='9000000000')
+            for i in range(threads * users_per_thread)
+        ])
+        users = list(User.objects.filter(username__startswith='bench_liker_').order_by('id'))
+        try:
+            post = Post.objects.create(author=users[0], content='Benchmark post')
+            groups = [
+                [user.pk for user in users[i * users_per_thread:(i + 1) * users_per_thread]]
+                for i in range(threads)
+            ]
+
+            sync = self._run(groups, toggles, lambda user_id: Post.toggle_like(post.pk, user_id))
+            self._report('synchronous', sync, threads * toggles)
+
+            ledger = LikeLedger()
+            buffered = self._run(groups, toggles, lambda user_id: ledger.toggle(user_id, post.pk))
+            started = time.perf_counter()
+            ledger.flush()
+            buffered = (buffered[0] + time.perf_counter() - started, buffered[1])
+            self._report('buffered', buffered, threads * toggles)
+
+            post.refresh_from_db(fields=['like_count'])
+            actual = Post.likes.through.objects.filter(post_id=post.pk).count()
+            self.stdout.write(f'Final like_count={post.like_count}, rows={actual}')
+        finally:
+            User.objects.filter(username__startswith='bench_liker_').delete()
+
+    def _run(self, groups, toggles, toggle):
+        errors = []
+
+        def worker(user_ids):
+            try:
+                for i in range(toggles):
+                    try:
+                        toggle(user_ids[i % len(user_ids)])
+                    except OperationalError:
+                        # SQLite lock timeouts are part of what is being measured
+                        errors.append(1)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=worker, args=(user_ids,)) for user_ids in groups]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return time.perf_counter() - started, len(errors)
+
+    def _report(self, label, result, total):
+        elapsed, errors = result
+        self.stdout.write(
+            f'{label:>12}: {total} toggles in {elapsed:.3f}s '
+            f'({total / elapsed:.0f}/s), {errors} failed'
+        )
@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.models import Max
+from posts.hashtags import index_posts
+from posts.models import Post
+
+class Command(BaseCommand):
+    help = 'Rebuild post topics from the hashtags in every post'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of post ids indexed per batch'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of batches indexed in parallel (SQLite always uses one)'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        max_id = Post.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        ranges = [(start, min(start + chunk_size, max_id)) for start in range(0, max_id, chunk_size)]
+
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            # SQLite takes one writer at a time; parallel batches only fail
+            # with "database is locked"
+            self.stdout.write('SQLite allows a single writer; indexing with one worker')
+            workers = 1
+
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(self.index_range_in_thread, ranges)
+                linked = sum(results)
+        else:
+            linked = sum(self.index_range(*id_range) for id_range in ranges)
+
+        self.stdout.write(self.style.SUCCESS(f'Linked {linked} new post topics.'))
+
+    def index_range(self, start, end):
+        posts = Post.objects.filter(id__gt=start, id__lte=end).only('id', 'content', 'created_at')
+        linked = len(index_posts(posts))
+        self.stdout.write(f"Indexed posts up to id {end}")
+        return linked
+
+    def index_range_in_thread(self, id_range):
+        try:
+            return self.index_range(*id_range)
+        finally:
+            # Worker threads open their own connections; close them when done
+            connections.close_all()
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from friends.models import Friendship
+from posts import timeline
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized home timeline of every user'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of users rebuilt per batch'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        total = User.objects.count()
+        done = 0
+        last_id = 0
+
+        while True:
+            user_ids = list(
+                User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size]
+            )
+            if not user_ids:
+                break
+
+            # Load the follow edges of the whole chunk in one query
+            following = {user_id: [] for user_id in user_ids}
+            for user_id, author_id in Friendship.objects.filter(
+                user1_id__in=user_ids,
+                status='accepted'
+            ).values_list('user1_id', 'user2_id'):
+                following[user_id].append(author_id)
+
+            for user_id in user_ids:
+                timeline.rebuild_timeline(user_id, following[user_id])
+
+            done += len(user_ids)
+            last_id = user_ids[-1]
+            self.stdout.write(f"Rebuilt {done}/{total} timelines")
+
+        self.stdout.write(self.style.SUCCESS('Timelines rebuilt.'))
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from posts import trending
+
+class Command(BaseCommand):
+    help = 'Recount the hourly topic buckets used for trending topics'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=None,
+            help='Only rebuild this many recent hours (default: everything)'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['hours'] is not None:
+            since = timezone.now() - timedelta(hours=options['hours'])
+        written = trending.rebuild(since)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} topic buckets.'))
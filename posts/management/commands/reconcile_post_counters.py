@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from posts.models import Post, Topic
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized like, comment and topic post counts and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Number of post ids checked per batch'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        max_id = Post.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        repaired = 0
+
+        for start in range(0, max_id, chunk_size):
+            repaired += Post.recount(
+                Post.objects.filter(id__gt=start, id__lte=start + chunk_size)
+            )
+            self.stdout.write(f"Checked posts up to id {min(start + chunk_size, max_id)}")
+
+        self.stdout.write(self.style.SUCCESS(f'Repaired counters on {repaired} posts.'))
+
+        topics = Topic.recount()
+        self.stdout.write(self.style.SUCCESS(f'Repaired post counts on {topics} topics.'))
@@ -0,0 +1,73 @@
+# Generated by Django 5.0.2 on 2026-10-18 15:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def copy_post_dates(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    PostTopic = apps.get_model('posts', 'PostTopic')
+    PostTopic.objects.update(created_at=Subquery(
+        Post.objects.filter(pk=OuterRef('post_id')).values('created_at')[:1]
+    ))
+
+
+def count_existing(apps, schema_editor):
+    Topic = apps.get_model('posts', 'Topic')
+    PostTopic = apps.get_model('posts', 'PostTopic')
+    links = PostTopic.objects.filter(
+        topic_id=OuterRef('pk')
+    ).order_by().values('topic_id').annotate(total=Count('*')).values('total')
+    Topic.objects.update(post_count=Coalesce(Subquery(links), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_like_comment_counts'),
+    ]
+
+    operations = [
+        # Adopt the auto-created posts_topic_posts table as an explicit model
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='PostTopic',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='posts.post')),
+                        ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='posts.topic')),
+                    ],
+                    options={
+                        'db_table': 'posts_topic_posts',
+                        'unique_together': {('topic', 'post')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='topic',
+                    name='posts',
+                    field=models.ManyToManyField(blank=True, related_name='topics', through='posts.PostTopic', to='posts.post'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='posttopic',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_post_dates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='posttopic',
+            index=models.Index(fields=['topic', '-created_at', '-post'], name='posts_topic_recent_idx'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:12
+
+from datetime import timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+
+
+def count_existing(apps, schema_editor):
+    PostTopic = apps.get_model('posts', 'PostTopic')
+    TopicBucket = apps.get_model('posts', 'TopicBucket')
+    counts = PostTopic.objects.annotate(
+        hour=TruncHour('created_at', tzinfo=timezone.utc)
+    ).order_by().values('topic_id', 'hour').annotate(total=Count('*'))
+    TopicBucket.objects.bulk_create(
+        [
+            TopicBucket(topic_id=row['topic_id'], hour=row['hour'], count=row['total'])
+            for row in counts.iterator()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_posttopic_topic_post_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopicBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='posts.topic')),
+            ],
+            options={
+                'ordering': ['-hour'],
+                'indexes': [models.Index(fields=['hour'], name='posts_topicbucket_hour_idx')],
+                'unique_together': {('topic', 'hour')},
+            },
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
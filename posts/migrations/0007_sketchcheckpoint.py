@@ -0,0 +1,25 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_topicbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SketchCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('width', models.PositiveIntegerField()),
+                ('depth', models.PositiveIntegerField()),
+                ('counts', models.BinaryField()),
+                ('candidates', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+    ]
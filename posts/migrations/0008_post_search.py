@@ -0,0 +1,79 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:20
+
+from django.db import migrations
+
+# FTS5 index over post content and author names, keyed by post id. Triggers
+# keep it in sync with every write, including queryset updates and deletes.
+CREATE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+        content,
+        author_name,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    INSERT INTO posts_post_fts (rowid, content, author_name)
+    SELECT p.id, p.content, u.username || ' ' || u.first_name || ' ' || u.last_name
+    FROM posts_post p JOIN accounts_customuser u ON u.id = p.author_id
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts (rowid, content, author_name)
+        SELECT new.id, new.content, u.username || ' ' || u.first_name || ' ' || u.last_name
+        FROM accounts_customuser u WHERE u.id = new.author_id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_update AFTER UPDATE OF content, author_id ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+        INSERT INTO posts_post_fts (rowid, content, author_name)
+        SELECT new.id, new.content, u.username || ' ' || u.first_name || ' ' || u.last_name
+        FROM accounts_customuser u WHERE u.id = new.author_id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_author AFTER UPDATE OF username, first_name, last_name
+    ON accounts_customuser BEGIN
+        UPDATE posts_post_fts
+        SET author_name = new.username || ' ' || new.first_name || ' ' || new.last_name
+        WHERE rowid IN (SELECT id FROM posts_post WHERE author_id = new.id);
+    END
+    """,
+]
+
+DROP_INDEX = [
+    'DROP TRIGGER IF EXISTS posts_post_fts_author',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TABLE IF EXISTS posts_post_fts',
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        # Other backends fall back to icontains in posts.search
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_alter_customuser_mobile_number'),
+        ('posts', '0007_sketchcheckpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_INDEX), run_on_sqlite(DROP_INDEX)),
+    ]
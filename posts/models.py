@@ -1,8 +1,23 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.urls import reverse
 
 
+COUNTER_FIELDS = ('like_count', 'comment_count')
+
+
+class PostQuerySet(models.QuerySet):
+    def with_viewer_state(self, user):
+        """Annotate ``is_liked_by_user`` for ``user`` with one EXISTS per post."""
+        if not user.is_authenticated:
+            return self.annotate(is_liked_by_user=Value(False))
+        return self.annotate(is_liked_by_user=Exists(
+            Post.like_rows(user.pk).filter(post_id=OuterRef('pk'))
+        ))
+
+
 class Post(models.Model):
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -18,6 +33,11 @@ class Post(models.Model):
         related_name='liked_posts',
         blank=True
     )
+    # Denormalized so feeds never load the likes/comments relations
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
@@ -28,6 +48,108 @@ class Post(models.Model):
     def get_absolute_url(self):
         return reverse('post_detail', kwargs={'pk': self.pk})
 
+    def save(self, *args, **kwargs):
+        # Counters only change through F() updates, so never write back the
+        # possibly stale values loaded with this instance
+        if not self._state.adding:
+            if kwargs.get('update_fields') is None:
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in COUNTER_FIELDS
+                ]
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.adjust_author_post_count(1)
+
+    def delete(self, *args, **kwargs):
+        from .trending import bucket_hour
+
+        with transaction.atomic():
+            # The topic links go with the post; keep their counts in step
+            topic_ids = list(PostTopic.objects.filter(post=self).values_list('topic_id', flat=True))
+            Topic.objects.filter(pk__in=topic_ids).update(post_count=F('post_count') - 1)
+            TopicBucket.objects.filter(
+                topic_id__in=topic_ids, hour=bucket_hour(self.created_at)
+            ).update(count=F('count') - 1)
+            self.adjust_author_post_count(-1)
+            return super().delete(*args, **kwargs)
+
+    def adjust_author_post_count(self, delta):
+        Post.author.field.related_model.objects.filter(pk=self.author_id).update(
+            post_count=F('post_count') + delta
+        )
+
+    @classmethod
+    def like_rows(cls, user_id):
+        """Rows of the likes through-table belonging to ``user_id``."""
+        user_field = cls.likes.field.m2m_reverse_field_name()
+        return cls.likes.through.objects.filter(**{user_field: user_id})
+
+    @classmethod
+    def toggle_like(cls, post_id, user_id):
+        """Like or unlike a post through its unique (post, user) index.
+
+        Returns True if the post is liked afterwards.
+        """
+        with transaction.atomic():
+            deleted, _ = cls.like_rows(user_id).filter(post_id=post_id).delete()
+            if deleted:
+                cls.adjust_counts(post_id, likes=-1)
+                return False
+            user_field = cls.likes.field.m2m_reverse_field_name()
+            try:
+                with transaction.atomic():
+                    cls.likes.through.objects.create(
+                        post_id=post_id, **{f'{user_field}_id': user_id}
+                    )
+            except IntegrityError:
+                # A concurrent request liked it first and already counted it
+                return True
+            cls.adjust_counts(post_id, likes=1)
+            return True
+
+    @classmethod
+    def adjust_counts(cls, post_id, likes=0, comments=0):
+        """Atomically add to a post's like and comment counters."""
+        changes = {}
+        if likes:
+            changes['like_count'] = F('like_count') + likes
+        if comments:
+            changes['comment_count'] = F('comment_count') + comments
+        if changes:
+            cls.objects.filter(pk=post_id).update(**changes)
+
+    @classmethod
+    def recount(cls, queryset=None):
+        """Recompute the counters of ``queryset`` (all posts by default).
+
+        Returns the number of posts whose counters had drifted.
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        likes = cls.likes.through.objects.filter(
+            post_id=OuterRef('pk')
+        ).values('post_id').annotate(total=Count('*')).values('total')
+        comments = Comment.objects.filter(
+            post_id=OuterRef('pk')
+        ).order_by().values('post_id').annotate(total=Count('*')).values('total')
+        actual_likes = Coalesce(Subquery(likes), 0)
+        actual_comments = Coalesce(Subquery(comments), 0)
+
+        drifted = queryset.annotate(
+            actual_likes=actual_likes,
+            actual_comments=actual_comments
+        ).exclude(
+            like_count=F('actual_likes'),
+            comment_count=F('actual_comments')
+        ).values_list('pk', flat=True)
+        return cls.objects.filter(pk__in=list(drifted)).update(
+            like_count=actual_likes,
+            comment_count=actual_comments
+        )
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -53,8 +175,15 @@ class Comment(models.Model):
 
 class Topic(models.Model):
     name = models.CharField(max_length=50, unique=True)
-    posts = models.ManyToManyField(Post, related_name='topics', blank=True)
+    posts = models.ManyToManyField(
+        Post,
+        through='PostTopic',
+        related_name='topics',
+        blank=True
+    )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized so topic pages and sidebars never count the relation
+    post_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ['-created_at']
@@ -63,4 +192,114 @@ class Topic(models.Model):
         return f"#{self.name}"
 
     def get_absolute_url(self):
-        return reverse('posts:topic_posts', kwargs={'topic': self.name}) 
\ No newline at end of file
+        return reverse('posts:topic_posts', kwargs={'topic': self.name})
+
+    @classmethod
+    def adjust_counts(cls, deltas):
+        """Atomically add ``{topic_id: delta}`` to topic post counts."""
+        for topic_id, delta in deltas.items():
+            if delta:
+                cls.objects.filter(pk=topic_id).update(post_count=F('post_count') + delta)
+
+    @classmethod
+    def recount(cls, queryset=None):
+        """Recompute ``post_count`` of ``queryset`` (all topics by default).
+
+        Returns the number of topics whose count had drifted.
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        links = PostTopic.objects.filter(
+            topic_id=OuterRef('pk')
+        ).order_by().values('topic_id').annotate(total=Count('*')).values('total')
+        actual = Coalesce(Subquery(links), 0)
+
+        drifted = queryset.annotate(actual=actual).exclude(
+            post_count=F('actual')
+        ).values_list('pk', flat=True)
+        return cls.objects.filter(pk__in=list(drifted)).update(post_count=actual)
+
+
+class PostTopic(models.Model):
+    """A post tagged with a topic."""
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    # Copied from the post so a topic page can be sorted without joining Post
+    created_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'posts_topic_posts'
+        unique_together = ('topic', 'post')
+        indexes = [
+            models.Index(
+                fields=['topic', '-created_at', '-post'],
+                name='posts_topic_recent_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} tagged #{self.topic_id}"
+
+
+class TopicBucket(models.Model):
+    """Number of posts tagged with a topic during one hour."""
+    topic = models.ForeignKey(
+        Topic,
+        on_delete=models.CASCADE,
+        related_name='buckets'
+    )
+    hour = models.DateTimeField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('topic', 'hour')
+        ordering = ['-hour']
+        indexes = [
+            models.Index(fields=['hour'], name='posts_topicbucket_hour_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.topic_id} x{self.count} at {self.hour:%Y-%m-%d %H:00}"
+
+
+class SketchCheckpoint(models.Model):
+    """Shared state of a Count-Min sketch merged from every worker process."""
+    name = models.CharField(max_length=50, unique=True)
+    width = models.PositiveIntegerField()
+    depth = models.PositiveIntegerField()
+    counts = models.BinaryField()
+    # Heaviest items at the last merge
+    candidates = models.JSONField(default=list)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} sketch ({self.width}x{self.depth})"
+
+
+class TimelineEntry(models.Model):
+    """A post materialized into one follower's home timeline."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    # Copied from the post so a timeline can be sorted without joining Post
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        ordering = ['-created_at', '-post']
+        indexes = [
+            models.Index(
+                fields=['user', '-created_at', '-post'],
+                name='posts_timeline_recent_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in {self.user_id}'s timeline"
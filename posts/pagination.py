@@ -0,0 +1,55 @@
+"""Keyset pagination over ``(created_at, id)``.
+
+Pages are addressed by an opaque cursor naming the last row already shown, so
+fetching page N+1 is one index range scan no matter how deep N is.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def encode_cursor(created_at, pk):
+    """Opaque, URL-safe cursor pointing just past ``(created_at, pk)``."""
+    raw = f'{created_at.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the ``(created_at, pk)`` named by ``cursor``, or None if invalid."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def before(position, created_field='created_at', id_field='id'):
+    """Filter matching rows ordered strictly after ``position`` newest-first."""
+    created_at, pk = position
+    return Q(**{f'{created_field}__lt': created_at}) | Q(
+        **{created_field: created_at, f'{id_field}__lt': pk}
+    )
+
+
+def paginate(queryset, cursor, page_size, created_field='created_at', id_field='id'):
+    """Return one newest-first page of ``queryset`` and the cursor for the next.
+
+    The next cursor is None when there is nothing after this page.
+    """
+    queryset = queryset.order_by(f'-{created_field}', f'-{id_field}')
+    position = decode_cursor(cursor)
+    if position:
+        queryset = queryset.filter(before(position, created_field, id_field))
+
+    items = list(queryset[:page_size + 1])
+    if len(items) <= page_size:
+        return items, None
+    items = items[:page_size]
+    last = items[-1]
+    return items, encode_cursor(getattr(last, created_field), getattr(last, id_field))
+
@@ -4,6 +4,7 @@ from django.contrib import messages
 from django.db.models import Q
 from .models import Post
 from .forms import PostForm
+from . import hashtags, search, timeline
 
 def is_staff(user):
     return user.is_staff
@@ -17,7 +18,7 @@ def post_list(request):
     posts = Post.objects.all().order_by('-created_at')
     
     if search_query:
-        posts = posts.filter(content__icontains=search_query)
+        posts = search.filter_posts(posts, search_query)
     
     if author_filter:
         posts = posts.filter(author__username__icontains=author_filter)
@@ -37,7 +38,9 @@ def edit_post(request, pk):
     if request.method == 'POST':
         form = PostForm(request.POST, request.FILES, instance=post)
         if form.is_valid():
-            form.save()
+            post = form.save()
+            hashtags.index_post(post)
+            timeline.fan_out_post(post)
             messages.success(request, 'Post updated successfully.')
             return redirect('posts:post_list')
     else:
@@ -0,0 +1,120 @@
+"""Full-text post search backed by the SQLite FTS5 table ``posts_post_fts``.
+
+The table mirrors each post's content and its author's names and is kept in
+sync by triggers (see migration 0008), so a search is one index lookup
+ranked by BM25 instead of ``icontains`` scans over ``Post`` and
+``CustomUser``. On other database backends the functions here fall back to
+``icontains`` filters.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+# Results per search page
+SEARCH_PAGE_SIZE = getattr(settings, 'SEARCH_PAGE_SIZE', 20)
+# Deepest page served; BM25 order can't be keyset-paginated
+SEARCH_MAX_PAGE = 50
+# Tokens in the snippet around the best match
+SNIPPET_TOKENS = 16
+
+FTS_TABLE = 'posts_post_fts'
+TOKEN_RE = re.compile(r'\w+')
+# Control characters never found in post text mark highlights in snippets
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """FTS5 query matching posts that contain every word of ``query``.
+
+    Words are quoted so user input can never be FTS5 syntax, and the last one
+    is a prefix match so results follow the user as they type.
+    """
+    tokens = TOKEN_RE.findall(query)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    """Escape ``snippet`` and turn its match markers into ``<mark>`` tags."""
+    return mark_safe(
+        escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    )
+
+
+def search_posts(query, page=1, per_page=SEARCH_PAGE_SIZE):
+    """One page of posts matching ``query``, best match first.
+
+    Returns ``(posts, has_next)``. Each post carries a ``snippet`` with the
+    matched words highlighted.
+    """
+    page = min(max(page, 1), SEARCH_MAX_PAGE)
+    offset = (page - 1) * per_page
+    expression = match_expression(query)
+    if expression is None:
+        return [], False
+
+    if not available():
+        posts = list(
+            filter_posts(Post.objects.select_related('author'), query)[offset:offset + per_page + 1]
+        )
+        for post in posts:
+            post.snippet = post.content
+        return posts[:per_page], len(posts) > per_page
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT rowid, snippet({FTS_TABLE}, 0, %s, %s, '…', %s)
+            FROM {FTS_TABLE}
+            WHERE {FTS_TABLE} MATCH %s
+            ORDER BY bm25({FTS_TABLE}, 1.0, 0.5)
+            LIMIT %s OFFSET %s
+            """,
+            [MARK_START, MARK_END, SNIPPET_TOKENS, expression, per_page + 1, offset]
+        )
+        rows = cursor.fetchall()
+
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    found = Post.objects.select_related('author').in_bulk([post_id for post_id, snippet in rows])
+    posts = []
+    for post_id, snippet in rows:
+        post = found.get(post_id)
+        if post is not None:
+            post.snippet = highlight(snippet)
+            posts.append(post)
+    return posts, has_next
+
+
+def filter_posts(queryset, query):
+    """Restrict a ``Post`` queryset to posts matching ``query``, keeping its order."""
+    expression = match_expression(query)
+    if expression is None:
+        return queryset.none()
+    if not available():
+        words = Q()
+        for token in TOKEN_RE.findall(query):
+            words &= (
+                Q(content__icontains=token) |
+                Q(author__username__icontains=token) |
+                Q(author__first_name__icontains=token) |
+                Q(author__last_name__icontains=token)
+            )
+        return queryset.filter(words)
+    return queryset.filter(id__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression]
+    ))
@@ -0,0 +1,291 @@
+"""Near-real-time trending hashtags from a Count-Min sketch.
+
+Every process keeps a fixed-size Count-Min sketch of hashtag use plus the
+``TRENDING_SKETCH_TOP_K`` heaviest tags, so ranking live trending costs no
+queries and memory does not grow with the number of distinct tags. Only the
+post counts shown next to the top tags are read from the hourly buckets, and
+cached.
+
+Every ``TRENDING_SKETCH_CHECKPOINT_INTERVAL`` seconds a process merges the
+counts it gathered since its last checkpoint into a shared ``SketchCheckpoint``
+row, decaying the stored counts by ``TRENDING_HALF_LIFE_HOURS`` first, and
+adopts the merged sketch. Workers thus see each other's tags and a restarted
+worker resumes from the checkpoint.
+"""
+import atexit
+import hashlib
+import heapq
+import logging
+import threading
+import time
+from array import array
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+
+from . import trending
+from .models import SketchCheckpoint
+
+# Counters per row and number of rows; error is about e / width of the total
+SKETCH_WIDTH = getattr(settings, 'TRENDING_SKETCH_WIDTH', 2048)
+SKETCH_DEPTH = getattr(settings, 'TRENDING_SKETCH_DEPTH', 4)
+# Number of heavy hitters tracked
+SKETCH_TOP_K = getattr(settings, 'TRENDING_SKETCH_TOP_K', 50)
+# Seconds between merges into the shared checkpoint
+CHECKPOINT_INTERVAL = getattr(settings, 'TRENDING_SKETCH_CHECKPOINT_INTERVAL', 60)
+HALF_LIFE_SECONDS = trending.TRENDING_HALF_LIFE_HOURS * 3600
+
+CHECKPOINT_NAME = 'trending'
+# Times a checkpoint re-reads the row after losing a race with another process
+CHECKPOINT_ATTEMPTS = 5
+
+logger = logging.getLogger(__name__)
+
+
+class CountMinSketch:
+    """Fixed-size frequency estimates that never undercount."""
+
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH, counts=None):
+        self.width = width
+        self.depth = depth
+        self.counts = counts if counts is not None else array('d', bytes(8 * width * depth))
+
+    def _cells(self, item):
+        # Stable across processes, unlike hash(), so checkpoints can be merged
+        digest = hashlib.blake2b(item.encode(), digest_size=8 * self.depth).digest()
+        for row in range(self.depth):
+            column = int.from_bytes(digest[8 * row:8 * row + 8], 'little') % self.width
+            yield row * self.width + column
+
+    def add(self, item, count=1):
+        """Count ``item`` and return its new estimate."""
+        estimate = None
+        for cell in self._cells(item):
+            self.counts[cell] += count
+            if estimate is None or self.counts[cell] < estimate:
+                estimate = self.counts[cell]
+        return estimate
+
+    def estimate(self, item):
+        return min(self.counts[cell] for cell in self._cells(item))
+
+    def merge(self, other):
+        """Add the counts of a sketch with the same dimensions."""
+        for cell, count in enumerate(other.counts):
+            self.counts[cell] += count
+
+    def scale(self, factor):
+        for cell, count in enumerate(self.counts):
+            self.counts[cell] = count * factor
+
+    def to_bytes(self):
+        return self.counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, width, depth, data):
+        counts = array('d')
+        counts.frombytes(data)
+        return cls(width, depth, counts)
+
+
+class TopK:
+    """The ``k`` items with the highest estimates seen so far."""
+
+    def __init__(self, k=SKETCH_TOP_K):
+        self.k = k
+        self.estimates = {}
+        # Min-heap of (estimate, item); entries superseded by a newer
+        # estimate are skipped when popped
+        self._heap = []
+
+    def offer(self, item, estimate):
+        if item not in self.estimates and len(self.estimates) >= self.k:
+            self._drop_stale()
+            if estimate <= self._heap[0][0]:
+                return
+            smallest = heapq.heappop(self._heap)[1]
+            del self.estimates[smallest]
+        self.estimates[item] = estimate
+        heapq.heappush(self._heap, (estimate, item))
+        if len(self._heap) > 4 * self.k:
+            self._heap = [(value, name) for name, value in self.estimates.items()]
+            heapq.heapify(self._heap)
+
+    def _drop_stale(self):
+        while self._heap and self.estimates.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def items(self):
+        """``(item, estimate)`` pairs, highest first."""
+        return sorted(self.estimates.items(), key=lambda pair: (-pair[1], pair[0]))
+
+
+class TrendingSketch:
+    """Thread-safe sketch of hashtag use, checkpointed to the database."""
+
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH, k=SKETCH_TOP_K,
+                 checkpoint_interval=CHECKPOINT_INTERVAL):
+        self.width = width
+        self.depth = depth
+        self.k = k
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = threading.Lock()
+        # Merged view of every process as of the last sync, plus local tags
+        self.sketch = CountMinSketch(width, depth)
+        self.top = TopK(k)
+        # Tags counted here since the last checkpoint
+        self.delta = CountMinSketch(width, depth)
+        self._dirty = False
+        self._synced_at = None
+
+    def _due(self):
+        return (
+            self._synced_at is None
+            or time.monotonic() - self._synced_at >= self.checkpoint_interval
+        )
+
+    def record(self, names):
+        """Count one use of each hashtag in ``names``."""
+        if not names:
+            return
+        with self._lock:
+            for name in names:
+                self.delta.add(name)
+                self.top.offer(name, self.sketch.add(name))
+            self._dirty = True
+            due = self._due()
+        if due:
+            # Runs after the post is saved; a failed merge must not fail it
+            try:
+                self.checkpoint()
+            except DatabaseError:
+                logger.exception('trending sketch checkpoint failed')
+
+    def top_topics(self, limit=trending.TRENDING_LIMIT):
+        """The heaviest hashtags as ``TrendingTopic`` tuples without post counts, best first.
+
+        Served from memory; at most once per checkpoint interval this first
+        syncs with the shared checkpoint to pick up other processes' tags.
+        """
+        if self._due():
+            try:
+                if self._dirty:
+                    self.checkpoint()
+                else:
+                    self.load()
+            except DatabaseError:
+                # Serve what this process has; local counts wait for the next sync
+                logger.exception('trending sketch sync failed')
+        with self._lock:
+            items = self.top.items()[:limit]
+        # Estimates are decayed, so they score topics but don't count posts
+        return [
+            trending.TrendingTopic(name, round(estimate, 3), None)
+            for name, estimate in items if round(estimate) >= 1
+        ]
+
+    def load(self):
+        """Adopt the shared checkpoint without contributing to it."""
+        row = SketchCheckpoint.objects.filter(name=CHECKPOINT_NAME).first()
+        shared = self._decayed(row)
+        with self._lock:
+            if shared is not None:
+                shared.merge(self.delta)
+                self._adopt(shared, row.candidates + list(self.top.estimates))
+            self._synced_at = time.monotonic()
+
+    def checkpoint(self):
+        """Merge local counts into the shared checkpoint and adopt the result."""
+        with self._lock:
+            self._synced_at = time.monotonic()
+            if not self._dirty:
+                return
+            delta, self.delta = self.delta, CountMinSketch(self.width, self.depth)
+            candidates = list(self.top.estimates)
+            self._dirty = False
+
+        try:
+            shared, top = self._merge(delta, candidates)
+        except Exception:
+            # Keep the counts for the next checkpoint
+            with self._lock:
+                self.delta.merge(delta)
+                self._dirty = True
+            raise
+
+        with self._lock:
+            # Tags recorded while the checkpoint was written stay in the delta
+            shared.merge(self.delta)
+            self._adopt(shared, list(top.estimates) + list(self.top.estimates))
+
+    def _merge(self, delta, candidates):
+        """Add ``delta`` to the shared checkpoint; return the merged sketch and top.
+
+        The row is replaced only if it is unchanged since it was read, since
+        SQLite has no row locks; a process that loses the race merges again
+        into the newer row.
+        """
+        for _ in range(CHECKPOINT_ATTEMPTS):
+            row = SketchCheckpoint.objects.filter(name=CHECKPOINT_NAME).first()
+            shared = self._decayed(row) or CountMinSketch(self.width, self.depth)
+            shared.merge(delta)
+            top = self._rank(shared, candidates + (row.candidates if row else []))
+            values = {
+                'width': self.width,
+                'depth': self.depth,
+                'counts': shared.to_bytes(),
+                'candidates': list(top.estimates),
+                'updated_at': timezone.now(),
+            }
+            if row is None:
+                try:
+                    with transaction.atomic():
+                        SketchCheckpoint.objects.create(name=CHECKPOINT_NAME, **values)
+                except IntegrityError:
+                    continue
+                return shared, top
+            if SketchCheckpoint.objects.filter(
+                pk=row.pk, updated_at=row.updated_at
+            ).update(**values):
+                return shared, top
+        raise DatabaseError(
+            f'trending checkpoint changed under {CHECKPOINT_ATTEMPTS} merges in a row'
+        )
+
+    def _decayed(self, row):
+        """The sketch stored in ``row`` aged to now, or None if unusable."""
+        if row is None or (row.width, row.depth) != (self.width, self.depth):
+            return None
+        shared = CountMinSketch.from_bytes(row.width, row.depth, bytes(row.counts))
+        elapsed = (timezone.now() - row.updated_at).total_seconds()
+        if elapsed > 0:
+            shared.scale(0.5 ** (elapsed / HALF_LIFE_SECONDS))
+        return shared
+
+    def _rank(self, sketch, candidates):
+        top = TopK(self.k)
+        for name in set(candidates):
+            top.offer(name, sketch.estimate(name))
+        return top
+
+    def _adopt(self, sketch, candidates):
+        self.sketch = sketch
+        self.top = self._rank(sketch, candidates)
+
+
+trending_sketch = TrendingSketch()
+atexit.register(trending_sketch.checkpoint)
+
+
+def live_trending(limit=trending.TRENDING_LIMIT):
+    """Trending topics from the sketch, or from the hourly buckets until it has any.
+
+    The sketch only ranks topics; their post counts are the hourly bucket
+    totals over the trending window, as ``trending.trending`` reports them.
+    """
+    topics = trending_sketch.top_topics(limit)
+    if not topics:
+        return trending.trending(limit=limit)
+    totals = trending.window_totals([topic.name for topic in topics])
+    return [topic._replace(post_count=totals[topic.name]) for topic in topics]
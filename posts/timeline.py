@@ -0,0 +1,270 @@
+"""Materialized home timelines.
+
+Posts are pushed into the timeline of each user following their author when
+they are written, so the home feed becomes a bounded read of pre-sorted post
+ids instead of an ``author_id__in`` query over the whole ``Post`` table.
+
+Authors with more than ``FEED_FANOUT_THRESHOLD`` followers are not pushed;
+their recent posts are cached per author and merged in when a timeline is
+read, so a single post never costs more than the threshold in writes.
+
+Both the push-or-pull decision for an author and a pulled author's recent
+posts live in each worker's own cache, so both are kept for only
+``FEED_RECENT_POSTS_TIMEOUT`` seconds. When an author crosses the threshold,
+the worker writing their next post may stop pushing while a reader's worker
+still holds the old decision; the reader pulls the author, and sees the post,
+once that entry expires a few seconds later. The recent post cache is
+likewise only cleared in the process that wrote the post, and other workers
+pick up the post within the same time.
+"""
+import heapq
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from friends.models import Friendship
+from . import pagination
+from .models import Post, TimelineEntry
+
+logger = logging.getLogger(__name__)
+
+# Number of entries kept per user by rebuilds and friend backfills
+TIMELINE_SIZE = getattr(settings, 'TIMELINE_SIZE', 500)
+# Number of posts served per home feed page
+FEED_PAGE_SIZE = getattr(settings, 'FEED_PAGE_SIZE', 20)
+# Authors with more followers than this are pulled at read time
+FEED_FANOUT_THRESHOLD = getattr(settings, 'FEED_FANOUT_THRESHOLD', 5000)
+# Number of recent posts cached per pulled author
+FEED_RECENT_POSTS = getattr(settings, 'FEED_RECENT_POSTS', 50)
+# Rows written per INSERT when fanning out
+FANOUT_BATCH_SIZE = 1000
+# How long push-or-pull decisions and pulled authors' recent posts stay cached
+FEED_RECENT_POSTS_TIMEOUT = getattr(settings, 'FEED_RECENT_POSTS_TIMEOUT', 10)
+
+PULL_AUTHOR_KEY = 'timeline:pull:{}'
+RECENT_POSTS_KEY = 'timeline:recent:{}'
+
+
+class FeedStats:
+    """Counts the timeline writes and per-author reads done by one request."""
+
+    def __init__(self):
+        self.pushes = 0
+        self.pulls = 0
+
+    def emit(self, response):
+        """Attach the counters to ``response`` and log them."""
+        response['X-Feed-Pushes'] = str(self.pushes)
+        response['X-Feed-Pulls'] = str(self.pulls)
+        logger.info('feed pushes=%d pulls=%d', self.pushes, self.pulls)
+        return response
+
+
+def followers_of(author_id):
+    """Ids of users whose home timeline shows posts by ``author_id``."""
+    return Friendship.objects.filter(
+        user2_id=author_id,
+        status='accepted'
+    ).values_list('user1_id', flat=True)
+
+
+def following_of(user_id):
+    """Ids of authors shown in the home timeline of ``user_id``."""
+    return Friendship.objects.filter(
+        user1_id=user_id,
+        status='accepted'
+    ).values_list('user2_id', flat=True)
+
+
+def pull_authors(author_ids):
+    """The subset of ``author_ids`` whose posts are merged in at read time."""
+    author_ids = list(author_ids)
+    keys = {author_id: PULL_AUTHOR_KEY.format(author_id) for author_id in author_ids}
+    cached = cache.get_many(keys.values())
+
+    pulled = {
+        author_id for author_id, key in keys.items() if cached.get(key)
+    }
+    missing = [author_id for author_id, key in keys.items() if key not in cached]
+    if missing:
+        counts = dict(
+            Friendship.objects.filter(
+                user2_id__in=missing,
+                status='accepted'
+            ).values('user2_id').annotate(
+                followers=Count('id')
+            ).values_list('user2_id', 'followers')
+        )
+        decisions = {
+            author_id: counts.get(author_id, 0) > FEED_FANOUT_THRESHOLD
+            for author_id in missing
+        }
+        cache.set_many(
+            {keys[author_id]: flag for author_id, flag in decisions.items()},
+            FEED_RECENT_POSTS_TIMEOUT
+        )
+        pulled.update(author_id for author_id, flag in decisions.items() if flag)
+    return pulled
+
+
+def recent_posts(author_id):
+    """Newest-first ``(created_at, id)`` pairs cached for a pulled author."""
+    key = RECENT_POSTS_KEY.format(author_id)
+    recent = cache.get(key)
+    if recent is None:
+        recent = [
+            (created_at, post_id)
+            for post_id, created_at in Post.objects.filter(
+                author_id=author_id
+            ).order_by('-created_at', '-id').values_list(
+                'id', 'created_at'
+            )[:FEED_RECENT_POSTS]
+        ]
+        cache.set(key, recent, FEED_RECENT_POSTS_TIMEOUT)
+    return recent
+
+
+def fan_out_post(post, stats=None):
+    """Deliver ``post`` to the followers of its author.
+
+    Posts by high-degree authors only refresh the author's recent post cache.
+    Everyone else is pushed into each follower's timeline. Safe to call again
+    for a post that was already delivered; existing entries are left untouched.
+    """
+    if post.author_id in pull_authors([post.author_id]):
+        cache.delete(RECENT_POSTS_KEY.format(post.author_id))
+        return
+
+    batch = []
+    pushed = 0
+    for follower_id in followers_of(post.author_id).iterator(chunk_size=FANOUT_BATCH_SIZE):
+        batch.append(TimelineEntry(
+            user_id=follower_id,
+            post_id=post.pk,
+            created_at=post.created_at
+        ))
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            pushed += len(batch)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        pushed += len(batch)
+    if stats is not None:
+        stats.pushes += pushed
+
+
+def add_author(user_id, author_id):
+    """Backfill the recent posts of a newly followed author."""
+    recent = Post.objects.filter(author_id=author_id).order_by(
+        '-created_at', '-id'
+    ).values_list('id', 'created_at')[:TIMELINE_SIZE]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=post_id, created_at=created_at)
+            for post_id, created_at in recent
+        ],
+        ignore_conflicts=True
+    )
+
+
+def remove_author(user_id, author_id):
+    """Drop an unfollowed author's posts from a user's timeline."""
+    TimelineEntry.objects.filter(
+        user_id=user_id,
+        post__author_id=author_id
+    ).delete()
+
+
+def rebuild_timeline(user_id, author_ids=None):
+    """Replace a user's timeline with the latest posts of everyone they follow."""
+    if author_ids is None:
+        author_ids = list(following_of(user_id))
+    recent = Post.objects.filter(author_id__in=author_ids).order_by(
+        '-created_at', '-id'
+    ).values_list('id', 'created_at')[:TIMELINE_SIZE] if author_ids else []
+
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(user_id=user_id, post_id=post_id, created_at=created_at)
+            for post_id, created_at in recent
+        ])
+
+
+def author_posts_before(author_id, position, limit):
+    """Newest-first ``(created_at, id)`` pairs by a pulled author.
+
+    Served from the recent post cache while it covers the requested range,
+    otherwise read from the author's posts with a keyset filter.
+    """
+    cached = recent_posts(author_id)
+    recent = cached
+    if position is not None:
+        recent = [item for item in cached if item < position]
+    # A short cache holds every post the author has, so it is always enough
+    if len(recent) >= limit or len(cached) < FEED_RECENT_POSTS:
+        return recent[:limit]
+
+    posts = Post.objects.filter(author_id=author_id)
+    if position is not None:
+        posts = posts.filter(pagination.before(position))
+    return [
+        (created_at, post_id)
+        for post_id, created_at in posts.order_by(
+            '-created_at', '-id'
+        ).values_list('id', 'created_at')[:limit]
+    ]
+
+
+def timeline_post_ids(user, position=None, limit=FEED_PAGE_SIZE, stats=None):
+    """Newest-first ``(created_at, id)`` pairs of a user's home timeline.
+
+    Pushed entries are merged with the recent posts of every pulled author the
+    user follows, keeping the ``(created_at, id)`` order. Only entries strictly
+    after ``position`` are returned.
+    """
+    entries = TimelineEntry.objects.filter(user=user)
+    if position is not None:
+        entries = entries.filter(pagination.before(position, id_field='post_id'))
+    pushed = [
+        (created_at, post_id)
+        for post_id, created_at in entries.order_by(
+            '-created_at', '-post_id'
+        ).values_list('post_id', 'created_at')[:limit]
+    ]
+    streams = [pushed]
+    for author_id in pull_authors(following_of(user.pk)):
+        streams.append(author_posts_before(author_id, position, limit))
+        if stats is not None:
+            stats.pulls += 1
+
+    page = []
+    seen = set()
+    for created_at, post_id in heapq.merge(*streams, reverse=True):
+        if post_id in seen:
+            continue
+        seen.add(post_id)
+        page.append((created_at, post_id))
+        if len(page) >= limit:
+            break
+    return page
+
+
+def timeline_page(user, cursor=None, limit=FEED_PAGE_SIZE, stats=None):
+    """One page of a user's home timeline and the cursor of the next page."""
+    page = timeline_post_ids(user, pagination.decode_cursor(cursor), limit + 1, stats)
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = pagination.encode_cursor(*page[-1])
+
+    posts = Post.objects.filter(
+        id__in=[post_id for created_at, post_id in page]
+    ).select_related('author').with_viewer_state(
+        user
+    ).order_by('-created_at', '-id')
+    return list(posts), next_cursor
@@ -0,0 +1,142 @@
+"""Trending topics from hourly tag counters.
+
+``index_posts`` adds every topic link it writes or removes to a
+``TopicBucket`` for the hour the post was created, so trending is a scan of
+at most ``window`` buckets per topic and never touches ``Post``. Each bucket
+is weighted by ``0.5 ** (age / half_life)`` so recent hours dominate, and the
+top topics are cached for ``TRENDING_CACHE_TIMEOUT`` seconds.
+"""
+from collections import Counter, defaultdict, namedtuple
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import PostTopic, Topic, TopicBucket
+
+# Hours of buckets considered by default
+TRENDING_WINDOW_HOURS = getattr(settings, 'TRENDING_WINDOW_HOURS', 7 * 24)
+# Age in hours at which a bucket counts half as much
+TRENDING_HALF_LIFE_HOURS = getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 24)
+# Seconds a computed top list is served from the cache
+TRENDING_CACHE_TIMEOUT = getattr(settings, 'TRENDING_CACHE_TIMEOUT', 60)
+# Number of topics returned by default
+TRENDING_LIMIT = 10
+
+TRENDING_KEY = 'trending:{}:{}:{}'
+TOTAL_KEY = 'trending:total:{}:{}'
+
+TrendingTopic = namedtuple('TrendingTopic', ['name', 'score', 'post_count'])
+
+
+def bucket_hour(moment):
+    """Start of the UTC hour containing ``moment``."""
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def record(deltas):
+    """Add ``{(topic_id, created_at): delta}`` to the hourly buckets."""
+    hourly = Counter()
+    for (topic_id, created_at), delta in deltas.items():
+        hourly[topic_id, bucket_hour(created_at)] += delta
+    hourly = {key: delta for key, delta in hourly.items() if delta}
+    if not hourly:
+        return
+
+    with transaction.atomic():
+        TopicBucket.objects.bulk_create(
+            [TopicBucket(topic_id=topic_id, hour=hour) for topic_id, hour in hourly],
+            ignore_conflicts=True
+        )
+        for (topic_id, hour), delta in hourly.items():
+            TopicBucket.objects.filter(topic_id=topic_id, hour=hour).update(
+                count=F('count') + delta
+            )
+
+
+def rebuild(since=None):
+    """Recount the buckets from ``since`` onwards from the topic links.
+
+    Returns the number of buckets written.
+    """
+    links = PostTopic.objects.all()
+    buckets = TopicBucket.objects.all()
+    if since is not None:
+        since = bucket_hour(since)
+        links = links.filter(created_at__gte=since)
+        buckets = buckets.filter(hour__gte=since)
+    counts = links.annotate(
+        hour=TruncHour('created_at', tzinfo=dt_timezone.utc)
+    ).order_by().values('topic_id', 'hour').annotate(total=Count('*')).values_list('topic_id', 'hour', 'total')
+
+    with transaction.atomic():
+        buckets.delete()
+        created = TopicBucket.objects.bulk_create(
+            [
+                TopicBucket(topic_id=topic_id, hour=hour, count=total)
+                for topic_id, hour, total in counts.iterator()
+            ],
+            batch_size=1000
+        )
+    return len(created)
+
+
+def compute(window_hours=TRENDING_WINDOW_HOURS, half_life=TRENDING_HALF_LIFE_HOURS,
+            limit=TRENDING_LIMIT):
+    """Score topics over the last ``window_hours`` hours, best first."""
+    now = timezone.now()
+    scores = defaultdict(float)
+    totals = Counter()
+    for topic_id, hour, count in TopicBucket.objects.filter(
+        hour__gte=bucket_hour(now - timedelta(hours=window_hours)),
+        count__gt=0
+    ).values_list('topic_id', 'hour', 'count').iterator():
+        age = max((now - hour).total_seconds() / 3600, 0)
+        scores[topic_id] += count * 0.5 ** (age / half_life)
+        totals[topic_id] += count
+
+    best = sorted(scores, key=lambda topic_id: (-scores[topic_id], topic_id))[:limit]
+    names = dict(Topic.objects.filter(pk__in=best).values_list('id', 'name'))
+    return [
+        TrendingTopic(names[topic_id], round(scores[topic_id], 3), totals[topic_id])
+        for topic_id in best if topic_id in names
+    ]
+
+
+def trending(window_hours=TRENDING_WINDOW_HOURS, half_life=TRENDING_HALF_LIFE_HOURS,
+             limit=TRENDING_LIMIT):
+    """The cached top ``limit`` topics over the last ``window_hours`` hours."""
+    key = TRENDING_KEY.format(window_hours, half_life, limit)
+    topics = cache.get(key)
+    if topics is None:
+        topics = compute(window_hours, half_life, limit)
+        cache.set(key, topics, TRENDING_CACHE_TIMEOUT)
+    return topics
+
+
+def window_totals(names, window_hours=TRENDING_WINDOW_HOURS):
+    """Posts tagged with each of ``names`` over the last ``window_hours`` hours.
+
+    Totals are cached per topic for ``TRENDING_CACHE_TIMEOUT`` seconds.
+    """
+    keys = {name: TOTAL_KEY.format(window_hours, name) for name in names}
+    cached = cache.get_many(keys.values())
+    totals = {name: cached[key] for name, key in keys.items() if key in cached}
+    missing = [name for name in names if name not in totals]
+    if missing:
+        since = bucket_hour(timezone.now() - timedelta(hours=window_hours))
+        counted = dict(
+            TopicBucket.objects.filter(
+                topic__name__in=missing, hour__gte=since
+            ).values('topic__name').annotate(total=Sum('count')).values_list('topic__name', 'total')
+        )
+        fresh = {name: counted.get(name, 0) for name in missing}
+        cache.set_many(
+            {keys[name]: total for name, total in fresh.items()}, TRENDING_CACHE_TIMEOUT
+        )
+        totals.update(fresh)
+    return totals
@@ -6,6 +6,7 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('feed/more/', views.home, {'fragment': True}, name='home_more'),
     path('create/', views.post_create, name='create_post'),
     path('post/<int:pk>/', views.post_detail, name='post_detail'),
     path('post/<int:pk>/edit/', views.post_edit, name='edit_post'),
@@ -14,6 +15,10 @@ urlpatterns = [
     path('post/<int:pk>/comment/', views.comment_create, name='add_comment'),
     path('comment/<int:pk>/delete/', views.delete_comment, name='delete_comment'),
     path('topic/<str:topic>/', views.topic_posts, name='topic_posts'),
+    path('topic/<str:topic>/more/', views.topic_posts, {'fragment': True}, name='topic_posts_more'),
+    path('trending/', views.trending_topics, name='trending_topics'),
+    path('search/', views.post_search, name='search'),
+    path('autocomplete/', views.autocomplete_view, name='autocomplete'),
     # Post management URLs
     path('management/', post_list, name='post_list'),
     path('management/post/<int:pk>/edit/', edit_post, name='edit_post_management'),
@@ -2,50 +2,54 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
+from django.urls import reverse
 from django.views.decorators.http import require_POST
-from .models import Post, Comment, Topic
+from .models import Post, Comment, PostTopic, Topic
 from .forms import PostForm, CommentForm
 from django.contrib.auth import logout
-from django.db.models import Q, Count
-from accounts.models import CustomUser
-from friends.models import Friendship
+from django.db import transaction
+from django.db.models import Q
+from friends import suggestions
+from . import autocomplete, hashtags, like_buffer, pagination, search, sketch, timeline, trending
 
 
-def home(request):
+def home(request, fragment=False):
+    stats = timeline.FeedStats()
+    cursor = request.GET.get('cursor')
     if request.user.is_authenticated:
-        # Get posts from users the current user is following
-        following = Friendship.objects.filter(
-            user1=request.user,
-            status='accepted'
-        ).values_list('user2_id', flat=True)
-        
-        posts = Post.objects.filter(
-            author_id__in=following
-        ).select_related('author').prefetch_related(
-            'likes', 'comments'
-        ).order_by('-created_at')
-        
-        # Get suggested users (users not being followed)
-        suggested_users = CustomUser.objects.exclude(
-            id__in=following
-        ).exclude(id=request.user.id).order_by('?')[:5]
+        # Read one pre-sorted page of the user's materialized timeline
+        posts, next_cursor = timeline.timeline_page(request.user, cursor, stats=stats)
+    else:
+        posts, next_cursor = pagination.paginate(
+            Post.objects.select_related('author').with_viewer_state(request.user),
+            cursor,
+            timeline.FEED_PAGE_SIZE
+        )
+    like_buffer.overlay(posts, request.user)
+
+    context = {
+        'posts': posts,
+        'next_cursor': next_cursor,
+        'more_url': reverse('posts:home_more'),
+    }
+    if fragment:
+        context['card_template'] = 'posts/includes/post_card.html'
+        return stats.emit(render(request, 'posts/post_cards.html', context))
+
+    if request.user.is_authenticated:
+        # Precomputed by the refresh_suggestions command
+        suggested_users = suggestions.suggested_users(request.user)
     else:
-        posts = Post.objects.all().select_related(
-            'author'
-        ).prefetch_related('likes', 'comments').order_by('-created_at')
         suggested_users = None
     
     # Get trending topics
-    trending_topics = Topic.objects.annotate(
-        post_count=Count('posts')
-    ).order_by('-post_count')[:10]
+    trending_topics = sketch.live_trending()
     
-    context = {
-        'posts': posts,
+    context.update({
         'suggested_users': suggested_users,
         'trending_topics': trending_topics,
-    }
-    return render(request, 'posts/home.html', context)
+    })
+    return stats.emit(render(request, 'posts/home.html', context))
 
 
 @login_required
@@ -56,8 +60,11 @@ def post_create(request):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            hashtags.index_post(post)
+            stats = timeline.FeedStats()
+            timeline.fan_out_post(post, stats)
             messages.success(request, 'Your post has been created!')
-            return redirect('accounts:home')
+            return stats.emit(redirect('accounts:home'))
     else:
         form = PostForm()
     return render(request, 'accounts/post_form.html', {'form': form})
@@ -65,7 +72,10 @@ def post_create(request):
 
 @login_required
 def post_detail(request, pk):
-    post = get_object_or_404(Post.objects.select_related('author').prefetch_related('likes', 'comments'), pk=pk)
+    post = get_object_or_404(
+        Post.objects.select_related('author').with_viewer_state(request.user), pk=pk
+    )
+    like_buffer.overlay([post], request.user)
     comments = post.comments.all().select_related('author')
     comment_form = CommentForm()
     
@@ -83,7 +93,7 @@ def post_edit(request, pk):
     if request.method == 'POST':
         form = PostForm(request.POST, request.FILES, instance=post)
         if form.is_valid():
-            form.save()
+            hashtags.index_post(form.save())
             messages.success(request, 'Your post has been updated!')
             return redirect('accounts:home')
     else:
@@ -104,19 +114,63 @@ def post_delete(request, pk):
 @login_required
 @require_POST
 def post_like(request, pk):
-    post = get_object_or_404(Post, pk=pk)
-    if request.user in post.likes.all():
-        post.likes.remove(request.user)
-        liked = False
-    else:
-        post.likes.add(request.user)
-        liked = True
+    post = get_object_or_404(Post.objects.only('id'), pk=pk)
+    liked, likes_count = like_buffer.toggle_like(post, request.user)
     return JsonResponse({
         'liked': liked,
-        'likes_count': post.likes.count()
+        'likes_count': likes_count
     })
 
 
+def trending_topics(request):
+    """Top topics as JSON, optionally over ``?hours=`` and ``?limit=``."""
+    try:
+        hours = min(max(int(request.GET.get('hours', trending.TRENDING_WINDOW_HOURS)), 1), 30 * 24)
+        limit = min(max(int(request.GET.get('limit', trending.TRENDING_LIMIT)), 1), 50)
+    except ValueError:
+        return JsonResponse({'error': 'hours and limit must be integers'}, status=400)
+    topics = trending.trending(window_hours=hours, limit=limit)
+    return JsonResponse({
+        'hours': hours,
+        'topics': [topic._asdict() for topic in topics],
+    })
+
+
+def post_search(request):
+    """Posts matching ``?q=``, best match first, with highlighted snippets."""
+    query = request.GET.get('q', '').strip()
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 1
+    page = min(max(page, 1), search.SEARCH_MAX_PAGE)
+    posts, has_next = search.search_posts(query, page) if query else ([], False)
+    return render(request, 'posts/search.html', {
+        'query': query,
+        'posts': posts,
+        'previous_page': page - 1 if page > 1 else None,
+        'next_page': page + 1 if has_next and page < search.SEARCH_MAX_PAGE else None,
+    })
+
+
+def autocomplete_view(request):
+    """Completions for a ``#topic`` or ``@username`` prefix as JSON."""
+    query = request.GET.get('q', '')
+    sigil, prefix = query[:1], query[1:]
+    if not hashtags.HASHTAG_RE.fullmatch(f'#{prefix}') or len(prefix) > hashtags.MAX_TOPIC_LENGTH:
+        return JsonResponse({'results': []})
+    if sigil == '#':
+        results = autocomplete.complete_topics(prefix)
+    elif sigil == '@':
+        # Usernames are only listed to signed-in users
+        if not request.user.is_authenticated:
+            return JsonResponse({'results': []}, status=401)
+        results = autocomplete.complete_usernames(prefix, request.user)
+    else:
+        results = []
+    return JsonResponse({'results': [f'{sigil}{name}' for name in results]})
+
+
 @login_required
 @require_POST
 def comment_create(request, pk):
@@ -126,7 +180,9 @@ def comment_create(request, pk):
         comment = form.save(commit=False)
         comment.post = post
         comment.author = request.user
-        comment.save()
+        with transaction.atomic():
+            comment.save()
+            Post.adjust_counts(post.pk, comments=1)
         messages.success(request, 'Your comment has been added!')
     return redirect('posts:post_detail', pk=post.pk)
 
@@ -134,8 +190,10 @@ def comment_create(request, pk):
 @login_required
 def delete_comment(request, pk):
     comment = get_object_or_404(Comment, pk=pk, author=request.user)
-    post_pk = comment.post.pk
-    comment.delete()
+    post_pk = comment.post_id
+    with transaction.atomic():
+        comment.delete()
+        Post.adjust_counts(post_pk, comments=-1)
     messages.success(request, 'Your comment has been deleted!')
     return redirect('posts:post_detail', pk=post_pk)
 
@@ -146,14 +204,31 @@ def logout_view(request):
 
 
 @login_required
-def topic_posts(request, topic):
+def topic_posts(request, topic, fragment=False):
     """View to display posts with a specific hashtag."""
-    posts = Post.objects.filter(
-        content__icontains=f'#{topic}'
-    ).select_related('author').prefetch_related('likes', 'comments').order_by('-created_at')
+    tag = Topic.objects.filter(name=topic.lower()).first()
+    links, next_cursor = pagination.paginate(
+        PostTopic.objects.filter(topic=tag),
+        request.GET.get('cursor'),
+        timeline.FEED_PAGE_SIZE,
+        id_field='post_id'
+    ) if tag else ([], None)
+    posts = list(Post.objects.filter(
+        id__in=[link.post_id for link in links]
+    ).select_related('author').with_viewer_state(
+        request.user
+    ).order_by('-created_at', '-id'))
+    like_buffer.overlay(posts, request.user)
     
     context = {
         'posts': posts,
         'topic': topic,
+        'next_cursor': next_cursor,
+        'more_url': reverse('posts:topic_posts_more', kwargs={'topic': topic}),
     }
-    return render(request, 'posts/topic_posts.html', context)
\ No newline at end of file
+    if fragment:
+        context['card_template'] = 'posts/includes/topic_post_card.html'
+        return render(request, 'posts/post_cards.html', context)
+
+    context['post_count'] = tag.post_count if tag else 0
+    return render(request, 'posts/topic_posts.html', context)
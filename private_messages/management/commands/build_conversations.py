@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from private_messages.models import Conversation, ConversationParticipant, Message
+
+class Command(BaseCommand):
+    help = 'Create the conversation of every pair of users who have exchanged messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Number of message ids read per batch'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        max_id = Message.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        conversations = {}
+
+        for start in range(0, max_id, chunk_size):
+            rows = Message.objects.filter(
+                id__gt=start, id__lte=start + chunk_size
+            ).order_by().values_list('id', 'sender_id', 'recipient_id', 'created_at')
+
+            # Messages and latest message of each pair within this chunk
+            message_ids = {}
+            latest = {}
+            for message_id, sender_id, recipient_id, created_at in rows:
+                pair = tuple(sorted((sender_id, recipient_id)))
+                message_ids.setdefault(pair, []).append(message_id)
+                if pair not in latest or (created_at, message_id) > latest[pair]:
+                    latest[pair] = (created_at, message_id)
+
+            for pair, (created_at, message_id) in latest.items():
+                if pair not in conversations:
+                    conversations[pair] = Conversation.between(*pair).pk
+                Message.objects.filter(id__in=message_ids[pair]).update(
+                    conversation_id=conversations[pair]
+                )
+                Conversation.advance(conversations[pair], message_id, created_at)
+
+            self.stdout.write(f"Read messages up to id {min(start + chunk_size, max_id)}")
+
+        repaired = ConversationParticipant.recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Built {len(conversations)} conversations; set unread counts on {repaired} participants.'
+        ))
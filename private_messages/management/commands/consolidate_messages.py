@@ -0,0 +1,166 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from friends.models import Message as FriendMessage
+from private_messages.models import Conversation, ConversationParticipant, Message
+
+# Table of the retired messages app, which is no longer installed
+LEGACY_TABLE = 'messages_message'
+
+
+def read_friends(after, limit):
+    return list(FriendMessage.objects.filter(id__gt=after).order_by('id').values_list(
+        'id', 'sender_id', 'receiver_id', 'content', 'created_at', 'is_read'
+    )[:limit])
+
+
+def read_legacy(after, limit):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT id, sender_id, recipient_id, content, created_at, is_read '
+            f'FROM {LEGACY_TABLE} WHERE id > %s ORDER BY id LIMIT %s',
+            [after, limit]
+        )
+        return [
+            (row_id, sender_id, recipient_id, content, to_datetime(created_at), bool(is_read))
+            for row_id, sender_id, recipient_id, content, created_at, is_read in cursor.fetchall()
+        ]
+
+
+def to_datetime(value):
+    # Raw SQLite rows hold text; stored times are UTC
+    if not isinstance(value, datetime):
+        value = parse_datetime(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+def first_unread_direct(conversation_id, recipient_id):
+    """Lowest id of a direct message the recipient has not read, or None."""
+    other_user_id, watermark = ConversationParticipant.objects.filter(
+        conversation_id=conversation_id, user_id=recipient_id
+    ).values_list('other_user_id', 'last_read_message_id').get()
+    return Message.objects.filter(
+        conversation_id=conversation_id, sender_id=other_user_id,
+        id__gt=watermark, source='direct'
+    ).order_by('id').values_list('id', flat=True).first()
+
+
+SOURCES = {
+    'friends': read_friends,
+    'messages': read_legacy,
+}
+
+
+class Command(BaseCommand):
+    help = 'Copy messages from the friends and retired messages apps into private_messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Number of source messages copied per batch'
+        )
+        parser.add_argument(
+            '--source',
+            choices=sorted(SOURCES),
+            action='append',
+            help='Only copy from this source (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        conversations = {}
+        # (conversation id, recipient id) -> lowest copied id still unread;
+        # read watermarks never pass it
+        unread = {}
+        copied = 0
+
+        for source in options['source'] or sorted(SOURCES):
+            if source == 'messages' and LEGACY_TABLE not in connection.introspection.table_names():
+                self.stdout.write(f"No {LEGACY_TABLE} table; skipping {source}")
+                continue
+            # Batches commit in source id order, so the highest id copied is
+            # where an interrupted run picks up
+            after = Message.objects.filter(source=source).aggregate(
+                last=Max('source_id')
+            )['last'] or 0
+            while True:
+                rows = SOURCES[source](after, chunk_size)
+                if not rows:
+                    break
+                copied += self.copy(source, rows, conversations, unread)
+                after = rows[-1][0]
+                self.stdout.write(f"Copied {source} messages up to id {after}")
+
+        repaired = ConversationParticipant.recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Copied {copied} messages into {len(conversations)} conversations; '
+            f'set unread counts on {repaired} participants.'
+        ))
+
+    def copy(self, source, rows, conversations, unread):
+        """Store one batch of source rows and advance their conversations.
+
+        Source read flags become participant read watermarks: each
+        recipient has read up to, not including, their first unread copy or
+        their first unread direct message, whichever comes first. Returns
+        the number of messages newly copied.
+        """
+        latest = {}
+        for row_id, sender_id, recipient_id, content, created_at, is_read in rows:
+            pair = tuple(sorted((sender_id, recipient_id)))
+            if pair not in latest or (created_at, row_id) > latest[pair]:
+                latest[pair] = (created_at, row_id)
+
+        with transaction.atomic():
+            for pair in latest:
+                if pair not in conversations:
+                    conversations[pair] = Conversation.between(*pair).pk
+            # ignore_conflicts hands back skipped rows too; count them up front
+            already = Message.objects.filter(
+                source=source, source_id__in=[row[0] for row in rows]
+            ).count()
+            Message.objects.bulk_create(
+                [
+                    Message(
+                        sender_id=sender_id,
+                        recipient_id=recipient_id,
+                        content=content,
+                        created_at=created_at,
+                        conversation_id=conversations[tuple(sorted((sender_id, recipient_id)))],
+                        source=source,
+                        source_id=row_id,
+                    )
+                    for row_id, sender_id, recipient_id, content, created_at, is_read in rows
+                ],
+                ignore_conflicts=True
+            )
+            copies = dict(Message.objects.filter(
+                source=source, source_id__in=[row[0] for row in rows]
+            ).values_list('source_id', 'id'))
+            for pair, (created_at, row_id) in latest.items():
+                Conversation.advance(conversations[pair], copies[row_id], created_at)
+
+            read = {}
+            for row_id, sender_id, recipient_id, content, created_at, is_read in rows:
+                key = (conversations[tuple(sorted((sender_id, recipient_id)))], recipient_id)
+                if is_read:
+                    read[key] = max(read.get(key, 0), copies[row_id])
+                else:
+                    unread[key] = min(unread.get(key, copies[row_id]), copies[row_id])
+            for key in read:
+                first_direct = first_unread_direct(*key)
+                if first_direct is not None:
+                    unread[key] = min(unread.get(key, first_direct), first_direct)
+            for (conversation_id, recipient_id), message_id in read.items():
+                if (conversation_id, recipient_id) in unread:
+                    message_id = min(message_id, unread[conversation_id, recipient_id] - 1)
+                ConversationParticipant.read_through(conversation_id, recipient_id, message_id)
+        return len(rows) - already
@@ -0,0 +1,65 @@
+# Generated by Django 5.0.2 on 2026-10-18 17:05
+
+from django.db import migrations
+
+# FTS5 index over message content keyed by message id, kept in sync by
+# triggers so new messages are searchable as soon as they are sent.
+CREATE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE private_messages_message_fts USING fts5(
+        content,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    INSERT INTO private_messages_message_fts (rowid, content)
+    SELECT id, content FROM private_messages_message
+    """,
+    """
+    CREATE TRIGGER private_messages_message_fts_insert
+    AFTER INSERT ON private_messages_message BEGIN
+        INSERT INTO private_messages_message_fts (rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER private_messages_message_fts_update
+    AFTER UPDATE OF content ON private_messages_message BEGIN
+        UPDATE private_messages_message_fts SET content = new.content WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER private_messages_message_fts_delete
+    AFTER DELETE ON private_messages_message BEGIN
+        DELETE FROM private_messages_message_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+DROP_INDEX = [
+    'DROP TRIGGER IF EXISTS private_messages_message_fts_delete',
+    'DROP TRIGGER IF EXISTS private_messages_message_fts_update',
+    'DROP TRIGGER IF EXISTS private_messages_message_fts_insert',
+    'DROP TABLE IF EXISTS private_messages_message_fts',
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        # Other backends fall back to icontains in private_messages.search
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('private_messages', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_INDEX), run_on_sqlite(DROP_INDEX)),
+    ]
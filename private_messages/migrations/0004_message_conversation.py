@@ -0,0 +1,40 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Greatest, Least
+
+
+def link_existing(apps, schema_editor):
+    # Messages of pairs without a conversation yet are linked by build_conversations
+    Message = apps.get_model('private_messages', 'Message')
+    Conversation = apps.get_model('private_messages', 'Conversation')
+    Message.objects.update(conversation=Subquery(
+        Conversation.objects.filter(
+            user1_id=Least(OuterRef('sender_id'), OuterRef('recipient_id')),
+            user2_id=Greatest(OuterRef('sender_id'), OuterRef('recipient_id'))
+        ).values('pk')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('private_messages', '0003_conversation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='private_messages.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'created_at', 'id'], name='pm_message_history_idx'),
+        ),
+        migrations.RunPython(link_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# SQLite rebuilds private_messages_message for the field changes below,
+# which drops the search triggers on it (see migration 0002), so they are
+# set aside for the rebuild and the index refilled afterwards
+SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER private_messages_message_fts_insert
+    AFTER INSERT ON private_messages_message BEGIN
+        INSERT INTO private_messages_message_fts (rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER private_messages_message_fts_update
+    AFTER UPDATE OF content ON private_messages_message BEGIN
+        UPDATE private_messages_message_fts SET content = new.content WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER private_messages_message_fts_delete
+    AFTER DELETE ON private_messages_message BEGIN
+        DELETE FROM private_messages_message_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+DROP_SEARCH_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS private_messages_message_fts_delete',
+    'DROP TRIGGER IF EXISTS private_messages_message_fts_update',
+    'DROP TRIGGER IF EXISTS private_messages_message_fts_insert',
+]
+
+REFILL_SEARCH_INDEX = [
+    'DELETE FROM private_messages_message_fts',
+    """
+    INSERT INTO private_messages_message_fts (rowid, content)
+    SELECT id, content FROM private_messages_message
+    """,
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('private_messages', '0004_message_conversation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_sqlite(DROP_SEARCH_TRIGGERS),
+            run_on_sqlite(SEARCH_TRIGGERS + REFILL_SEARCH_INDEX)
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='source',
+            field=models.CharField(choices=[('direct', 'Direct'), ('friends', 'Friends'), ('messages', 'Messages')], default='direct', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='source_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['recipient', 'sender', 'is_read'], name='pm_message_unread_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(fields=('source', 'source_id'), name='pm_message_source_unique'),
+        ),
+        migrations.RunPython(
+            run_on_sqlite(SEARCH_TRIGGERS + REFILL_SEARCH_INDEX),
+            run_on_sqlite(DROP_SEARCH_TRIGGERS)
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+# Removing is_read rebuilds private_messages_message on SQLite; the search
+# triggers are set aside around it as in 0005
+SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER private_messages_message_fts_insert
+    AFTER INSERT ON private_messages_message BEGIN
+        INSERT INTO private_messages_message_fts (rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER private_messages_message_fts_update
+    AFTER UPDATE OF content ON private_messages_message BEGIN
+        UPDATE private_messages_message_fts SET content = new.content WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER private_messages_message_fts_delete
+    AFTER DELETE ON private_messages_message BEGIN
+        DELETE FROM private_messages_message_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+DROP_SEARCH_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS private_messages_message_fts_delete',
+    'DROP TRIGGER IF EXISTS private_messages_message_fts_update',
+    'DROP TRIGGER IF EXISTS private_messages_message_fts_insert',
+]
+
+REFILL_SEARCH_INDEX = [
+    'DELETE FROM private_messages_message_fts',
+    """
+    INSERT INTO private_messages_message_fts (rowid, content)
+    SELECT id, content FROM private_messages_message
+    """,
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+def set_watermarks(apps, schema_editor):
+    # Read up to just before the first unread message, or everything
+    Message = apps.get_model('private_messages', 'Message')
+    ConversationParticipant = apps.get_model('private_messages', 'ConversationParticipant')
+    incoming = Message.objects.filter(
+        conversation_id=OuterRef('conversation_id'),
+        sender_id=OuterRef('other_user_id')
+    ).order_by().values('conversation_id')
+    first_unread = incoming.filter(is_read=False).annotate(first=Min('id')).values('first')
+    last = incoming.annotate(last=Max('id')).values('last')
+    ConversationParticipant.objects.update(
+        last_read_message_id=Coalesce(Subquery(first_unread) - 1, Subquery(last), 0)
+    )
+    # unread_count was kept from is_read; count what the watermarks now leave unread
+    unread = Message.objects.filter(
+        conversation_id=OuterRef('conversation_id'),
+        sender_id=OuterRef('other_user_id'),
+        id__gt=OuterRef('last_read_message_id')
+    ).order_by().values('conversation_id').annotate(total=Count('*')).values('total')
+    ConversationParticipant.objects.update(unread_count=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('private_messages', '0005_message_source'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_sqlite(DROP_SEARCH_TRIGGERS),
+            run_on_sqlite(SEARCH_TRIGGERS + REFILL_SEARCH_INDEX)
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='last_read_message_id',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(set_watermarks, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='message',
+            name='pm_message_unread_idx',
+        ),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'sender', 'id'], name='pm_message_unread_idx'),
+        ),
+        migrations.RunPython(
+            run_on_sqlite(SEARCH_TRIGGERS + REFILL_SEARCH_INDEX),
+            run_on_sqlite(DROP_SEARCH_TRIGGERS)
+        ),
+    ]
@@ -1,11 +1,32 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
+from posts import pagination
+
 User = get_user_model()
 
+# Messages shown per page of a conversation
+HISTORY_PAGE_SIZE = 30
+
 
 class Message(models.Model):
+    """A direct message; the one store behind every messaging view.
+
+    Messages sent before the stores were merged are copied in by
+    ``consolidate_messages`` and keep the app and id they came from in
+    ``source`` and ``source_id``. Whether a message has been read is not
+    stored on it: it is unread while its id is above its recipient's
+    ``ConversationParticipant.last_read_message_id``.
+    """
+    SOURCE_CHOICES = (
+        ('direct', 'Direct'),
+        ('friends', 'Friends'),
+        ('messages', 'Messages'),
+    )
+
     sender = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -18,11 +39,216 @@ class Message(models.Model):
     )
     content = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
-    is_read = models.BooleanField(default=False)
+    conversation = models.ForeignKey(
+        'Conversation',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='messages'
+    )
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='direct')
+    source_id = models.PositiveBigIntegerField(null=True, blank=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Conversation history, read newest first a page at a time
+            models.Index(
+                fields=['conversation', 'created_at', 'id'],
+                name='pm_message_history_idx'
+            ),
+            # Counting the messages one participant sent past a read watermark
+            models.Index(
+                fields=['conversation', 'sender', 'id'],
+                name='pm_message_unread_idx'
+            ),
+        ]
+        constraints = [
+            # Each copied message once; also how consolidate_messages resumes
+            models.UniqueConstraint(
+                fields=['source', 'source_id'],
+                name='pm_message_source_unique'
+            ),
+        ]
+        app_label = 'private_messages'
+
+    def __str__(self):
+        return f'Message from {self.sender} to {self.recipient}'
+
+
+class Conversation(models.Model):
+    """The messages between two users, with a pointer to the latest one.
+
+    ``user1`` is always the participant with the lower id, so each pair has
+    exactly one row.
+    """
+    user1 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    user2 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    last_message = models.ForeignKey(
+        Message,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user1', 'user2')
+        app_label = 'private_messages'
+
+    def __str__(self):
+        return f'Conversation between {self.user1_id} and {self.user2_id}'
+
+    @classmethod
+    def between(cls, user_a, user_b):
+        """The conversation of two user ids and its participant rows, created if needed."""
+        user1, user2 = sorted((user_a, user_b))
+        conversation, created = cls.objects.get_or_create(user1_id=user1, user2_id=user2)
+        if created:
+            ConversationParticipant.objects.bulk_create(
+                [
+                    ConversationParticipant(conversation=conversation, user_id=user, other_user_id=other)
+                    for user, other in {(user1, user2), (user2, user1)}
+                ],
+                ignore_conflicts=True
+            )
+        return conversation
+
+    @classmethod
+    def deliver(cls, sender, recipient, content, **fields):
+        """Create a message and update its conversation in one transaction."""
+        with transaction.atomic():
+            conversation = cls.between(sender.pk, recipient.pk)
+            message = Message.objects.create(
+                sender=sender, recipient=recipient, content=content,
+                conversation=conversation, **fields
+            )
+            cls.advance(conversation.pk, message.pk, message.created_at)
+            if sender.pk != recipient.pk:
+                ConversationParticipant.objects.filter(
+                    conversation=conversation, user=recipient
+                ).update(unread_count=F('unread_count') + 1)
+        return message
+
+    @classmethod
+    def advance(cls, conversation_id, message_id, created_at):
+        """Point a conversation at a message unless it already has a later one."""
+        updated = cls.objects.filter(pk=conversation_id).filter(
+            Q(last_message_at__isnull=True) |
+            Q(last_message_at__lt=created_at) |
+            Q(last_message_at=created_at, last_message_id__lt=message_id)
+        ).update(last_message_id=message_id, last_message_at=created_at)
+        if updated:
+            ConversationParticipant.objects.filter(
+                conversation_id=conversation_id
+            ).update(last_message_at=created_at)
+        return bool(updated)
+
+    @classmethod
+    def find(cls, user_a, user_b):
+        """The conversation of two user ids, or None if they never messaged."""
+        user1, user2 = sorted((user_a, user_b))
+        return cls.objects.filter(user1_id=user1, user2_id=user2).first()
+
+    def history(self, cursor=None, page_size=HISTORY_PAGE_SIZE):
+        """One page of messages, oldest first, ending just before ``cursor``.
+
+        Pages are read newest first over the history index, so every page
+        costs the same however long the conversation is. Returns
+        ``(messages, older_cursor)``; ``older_cursor`` is None on the first
+        message.
+        """
+        page, older_cursor = pagination.paginate(
+            Message.objects.filter(conversation=self), cursor, page_size
+        )
+        page.reverse()
+        return page, older_cursor
+
+    def mark_read(self, user):
+        """Mark everything the other participant sent ``user`` as read.
+
+        A single-row update of the user's participant row; the messages
+        themselves are not touched. The watermark is the highest id sent,
+        not the latest message, since copied messages can be older than
+        messages with lower ids.
+        """
+        other_id = self.user2_id if user.pk == self.user1_id else self.user1_id
+        # One probe of the (conversation, sender, id) index, however long the thread
+        newest = Message.objects.filter(
+            conversation=self, sender_id=other_id
+        ).order_by('-id').values('id')[:1]
+        return ConversationParticipant.objects.filter(conversation=self, user=user).update(
+            last_read_message_id=Coalesce(Subquery(newest), F('last_read_message_id')),
+            unread_count=0
+        )
+
+class ConversationParticipant(models.Model):
+    """One user's side of a conversation: their inbox row."""
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='participants'
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations')
+    # The other participant, copied so the inbox needs no join through Conversation
+    other_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    # Copied from the conversation so the inbox can be read in index order
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    # Messages from other_user up to this id have been read
+    last_read_message_id = models.PositiveBigIntegerField(default=0)
+    # Messages from other_user past last_read_message_id, kept by deliver()
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'conversation')
+        indexes = [
+            models.Index(
+                fields=['user', '-last_message_at'],
+                name='pm_participant_inbox_idx'
+            ),
+        ]
         app_label = 'private_messages'
 
     def __str__(self):
-        return f'Message from {self.sender} to {self.recipient}' 
\ No newline at end of file
+        return f'{self.user_id} in conversation {self.conversation_id}'
+
+    @property
+    def last_message(self):
+        return self.conversation.last_message
+
+    @classmethod
+    def inbox(cls, user):
+        """A user's conversations, most recently active first, in one query."""
+        return cls.objects.filter(
+            user=user, last_message_at__isnull=False
+        ).select_related('other_user', 'conversation__last_message').order_by('-last_message_at')
+
+    @classmethod
+    def recount(cls, queryset=None):
+        """Recompute ``unread_count`` of ``queryset`` (all participants by default).
+
+        Returns the number of participants whose count had drifted.
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        unread = Message.objects.filter(
+            conversation_id=OuterRef('conversation_id'),
+            sender_id=OuterRef('other_user_id'),
+            id__gt=OuterRef('last_read_message_id')
+        ).order_by().values('conversation_id').annotate(total=Count('*')).values('total')
+        actual = Coalesce(Subquery(unread), 0)
+
+        drifted = queryset.annotate(actual=actual).exclude(
+            unread_count=F('actual')
+        ).values_list('pk', flat=True)
+        return cls.objects.filter(pk__in=list(drifted)).update(unread_count=actual)
+
+    @classmethod
+    def read_through(cls, conversation_id, user_id, message_id):
+        """Move a participant's read watermark up to ``message_id``, never back."""
+        return cls.objects.filter(
+            conversation_id=conversation_id, user_id=user_id,
+            last_read_message_id__lt=message_id
+        ).update(last_read_message_id=message_id)
@@ -0,0 +1,86 @@
+"""Full-text search over a user's private messages.
+
+Matches come from the FTS5 table ``private_messages_message_fts`` (see
+migration 0002) and are restricted to messages the viewer sent or received,
+newest first, one keyset page at a time. On other database backends the
+content match falls back to ``icontains``.
+"""
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from posts import pagination
+from posts.search import MARK_END, MARK_START, SNIPPET_TOKENS, TOKEN_RE, highlight, match_expression
+from .models import Message
+
+# Messages per search page
+SEARCH_PAGE_SIZE = 20
+
+FTS_TABLE = 'private_messages_message_fts'
+
+
+def matching(queryset, query):
+    """Restrict a ``Message`` queryset to messages whose content matches ``query``."""
+    expression = match_expression(query)
+    if expression is None:
+        return queryset.none()
+    if connection.vendor != 'sqlite':
+        words = Q()
+        for token in TOKEN_RE.findall(query):
+            words &= Q(content__icontains=token)
+        return queryset.filter(words)
+    return queryset.filter(id__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression]
+    ))
+
+
+def snippets(message_ids, query):
+    """Highlighted snippets of the matching messages, by message id."""
+    expression = match_expression(query)
+    if not message_ids or expression is None or connection.vendor != 'sqlite':
+        return {}
+    placeholders = ', '.join(['%s'] * len(message_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT rowid, snippet({FTS_TABLE}, 0, %s, %s, '…', %s)
+            FROM {FTS_TABLE}
+            WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})
+            """,
+            [MARK_START, MARK_END, SNIPPET_TOKENS, expression, *message_ids]
+        )
+        return {message_id: highlight(snippet) for message_id, snippet in cursor.fetchall()}
+
+
+def search_messages(user, query, other_user=None, start=None, end=None, cursor=None,
+                    limit=SEARCH_PAGE_SIZE):
+    """One page of ``user``'s messages matching ``query``, newest first.
+
+    ``other_user`` limits results to one conversation and ``start``/``end``
+    to a date range (inclusive). Returns ``(messages, next_cursor)``; each
+    message carries ``other_user``, a highlighted ``snippet`` and a
+    ``context_cursor`` opening its conversation on the page ending with it.
+    """
+    if other_user is not None:
+        messages = Message.objects.filter(
+            Q(sender=user, recipient=other_user) | Q(sender=other_user, recipient=user)
+        )
+    else:
+        messages = Message.objects.filter(Q(sender=user) | Q(recipient=user))
+    if start is not None:
+        messages = messages.filter(created_at__date__gte=start)
+    if end is not None:
+        messages = messages.filter(created_at__date__lte=end)
+
+    page, next_cursor = pagination.paginate(
+        matching(messages, query).select_related('sender', 'recipient'),
+        cursor,
+        limit
+    )
+    found = snippets([message.pk for message in page], query)
+    for message in page:
+        message.other_user = message.recipient if message.sender_id == user.pk else message.sender
+        message.snippet = found.get(message.pk, message.content)
+        # Just past the message, so the history page ends with it
+        message.context_cursor = pagination.encode_cursor(message.created_at, message.pk + 1)
+    return page, next_cursor
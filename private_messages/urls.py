@@ -5,5 +5,7 @@ app_name = 'private_messages'
 
 urlpatterns = [
     path('', views.messages, name='messages'),
+    path('search/', views.search, name='search'),
+    path('<str:username>/older/', views.messages, {'fragment': True}, name='older_messages'),
     path('<str:username>/', views.messages, name='messages'),
 ] 
\ No newline at end of file
@@ -1,97 +1,90 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
-from django.db.models import Q, Max, Count
-from .models import Message
+from django.urls import reverse
+from datetime import date
+from .models import Conversation, ConversationParticipant
+from . import search as message_search
 
 User = get_user_model()
 
 @login_required
-def messages(request, username=None):
-    # Get all conversations for the current user
-    conversations = []
-    sent_messages = Message.objects.filter(sender=request.user).values('recipient').annotate(
-        last_message=Max('created_at')
-    )
-    received_messages = Message.objects.filter(recipient=request.user).values('sender').annotate(
-        last_message=Max('created_at')
-    )
-    
-    # Combine and process conversations
-    for msg in sent_messages:
-        other_user = User.objects.get(id=msg['recipient'])
-        last_message = Message.objects.filter(
-            Q(sender=request.user, recipient=other_user) |
-            Q(sender=other_user, recipient=request.user)
-        ).latest('created_at')
-        
-        unread_count = Message.objects.filter(
-            sender=other_user,
-            recipient=request.user,
-            is_read=False
-        ).count()
-        
-        conversations.append({
-            'other_user': other_user,
-            'last_message': last_message,
-            'unread_count': unread_count
-        })
-    
-    for msg in received_messages:
-        other_user = User.objects.get(id=msg['sender'])
-        if not any(c['other_user'].id == other_user.id for c in conversations):
-            last_message = Message.objects.filter(
-                Q(sender=request.user, recipient=other_user) |
-                Q(sender=other_user, recipient=request.user)
-            ).latest('created_at')
-            
-            unread_count = Message.objects.filter(
-                sender=other_user,
-                recipient=request.user,
-                is_read=False
-            ).count()
-            
-            conversations.append({
-                'other_user': other_user,
-                'last_message': last_message,
-                'unread_count': unread_count
-            })
-    
-    # Sort conversations by last message time
-    conversations.sort(key=lambda x: x['last_message'].created_at, reverse=True)
-    
+def messages(request, username=None, fragment=False):
     # Get active conversation if username is provided
     active_conversation = None
     if username:
         other_user = get_object_or_404(User, username=username)
-        messages = Message.objects.filter(
-            (Q(sender=request.user) & Q(recipient=other_user)) |
-            (Q(sender=other_user) & Q(recipient=request.user))
-        ).order_by('created_at')
         
-        # Mark messages as read
-        Message.objects.filter(
-            recipient=request.user,
-            sender=other_user,
-            is_read=False
-        ).update(is_read=True)
+        if request.method == 'POST' and not fragment:
+            content = request.POST.get('content')
+            if content:
+                Conversation.deliver(request.user, other_user, content)
+                return redirect('private_messages:messages', username=username)
         
+        # Newest page first; older pages come from the older_messages fragment
+        conversation = Conversation.find(request.user.pk, other_user.pk)
+        messages, older_cursor = [], None
+        if conversation is not None:
+            messages, older_cursor = conversation.history(request.GET.get('cursor'))
+
         active_conversation = {
             'other_user': other_user,
-            'messages': messages
+            'messages': messages,
+            'older_cursor': older_cursor,
+            'older_url': reverse('private_messages:older_messages', kwargs={'username': username}),
         }
-        
-        if request.method == 'POST':
-            content = request.POST.get('content')
-            if content:
-                Message.objects.create(
-                    sender=request.user,
-                    recipient=other_user,
-                    content=content
-                )
-                return redirect('private_messages:messages', username=username)
+        if fragment:
+            return render(request, 'private_messages/message_page.html', dict(
+                active_conversation,
+                message_template='private_messages/includes/message.html'
+            ))
+
+        # Mark messages as read
+        if conversation is not None:
+            conversation.mark_read(request.user)
+
+    # One indexed query over the user's participant rows
+    conversations = ConversationParticipant.inbox(request.user)
     
     return render(request, 'private_messages/messages.html', {
         'conversations': conversations,
         'active_conversation': active_conversation
-    }) 
\ No newline at end of file
+    })
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+@login_required
+def search(request):
+    query = request.GET.get('q', '').strip()
+    username = request.GET.get('with', '').strip()
+    start = parse_date(request.GET.get('from'))
+    end = parse_date(request.GET.get('to'))
+    other_user = User.objects.filter(username=username).first() if username else None
+
+    results, next_cursor = [], None
+    if query and (other_user is not None or not username):
+        results, next_cursor = message_search.search_messages(
+            request.user,
+            query,
+            other_user=other_user,
+            start=start,
+            end=end,
+            cursor=request.GET.get('cursor')
+        )
+
+    filters = request.GET.copy()
+    filters.pop('cursor', None)
+    return render(request, 'private_messages/search.html', {
+        'query': query,
+        'username': username,
+        'start': start,
+        'end': end,
+        'results': results,
+        'next_cursor': next_cursor,
+        'filters': filters.urlencode(),
+    })
@@ -64,6 +64,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'notifications.context_processors.live_events',
             ],
         },
     },
@@ -152,4 +153,52 @@ def get_user_display(user):
 ACCOUNT_USER_DISPLAY = get_user_display
 
 ACCOUNT_SIGNUP_REDIRECT_URL = 'accounts:home'
-ACCOUNT_LOGIN_ON_SIGNUP = True 
\ No newline at end of file
+ACCOUNT_LOGIN_ON_SIGNUP = True 
+# Home timeline settings
+TIMELINE_SIZE = 500
+FEED_PAGE_SIZE = 20
+# Authors above this many followers are merged in at read time instead of pushed
+FEED_FANOUT_THRESHOLD = 5000
+FEED_RECENT_POSTS = 50
+# Seconds workers cache an author's push-or-pull decision and a pulled author's
+# recent posts; other workers may miss that author's newest post for this long
+FEED_RECENT_POSTS_TIMEOUT = 10
+
+# Buffer like toggles in memory and write them in batches (for viral posts)
+POSTS_BUFFERED_LIKES = False
+LIKE_BUFFER_FLUSH_INTERVAL = 1.0
+LIKE_BUFFER_MAX_PENDING = 500
+LIKE_BUFFER_MAX_ATTEMPTS = 3
+
+# Trending topics: hours of hourly buckets scored, their half-life and cache TTL
+TRENDING_WINDOW_HOURS = 168
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_CACHE_TIMEOUT = 60
+
+# Live trending sketch: size, heavy hitters kept and seconds between checkpoints
+TRENDING_SKETCH_WIDTH = 2048
+TRENDING_SKETCH_DEPTH = 4
+TRENDING_SKETCH_TOP_K = 50
+TRENDING_SKETCH_CHECKPOINT_INTERVAL = 60
+
+# Hashtag and mention autocomplete: seconds between index rebuilds and result cache TTL
+AUTOCOMPLETE_REBUILD_INTERVAL = 600
+AUTOCOMPLETE_CACHE_TIMEOUT = 60
+
+# Seconds between reloads of the in-memory friendship graph (friends.graph)
+FRIEND_GRAPH_REBUILD_INTERVAL = 3600
+
+# Friend suggestions (friends.suggestions): rows stored per user and days of topics compared
+FRIEND_SUGGESTION_LIMIT = 20
+FRIEND_SUGGESTION_TOPIC_DAYS = 30
+
+# Live events (notifications.broker): only enable the stream when served by an
+# ASGI server; under runserver/WSGI each open stream would tie up a thread
+EVENT_STREAM_ENABLED = False
+# Delivery between workers, keepalive seconds and seconds before a stream ends
+# and the browser reconnects
+EVENT_BROKER_BACKEND = 'notifications.broker.LocalBackend'
+EVENT_BROKER_PATH = BASE_DIR / 'events.sqlite3'
+EVENT_BROKER_POLL_INTERVAL = 0.5
+EVENT_STREAM_KEEPALIVE = 15
+EVENT_STREAM_LIFETIME = 300